@@ -0,0 +1,83 @@
+import os
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, Distance, HnswConfigDiff, Modifier, PayloadSchemaType,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams,
+    SparseVectorParams, VectorParams,
+)
+
+# Layout of the berlin_events collection. Defaults reproduce the original in-RAM float32 setup;
+# the vector layout of an existing collection is only changed by migrate_collection.py.
+EMBEDDING_DIM = 3072
+# Matryoshka truncation: keep only the first VECTOR_DIM components of each embedding
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", str(EMBEDDING_DIM)))
+QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()  # none | scalar | binary
+ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "false").lower() == "true"
+ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "false").lower() == "true"
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# Quantized search fetches limit * oversampling candidates and rescores them with the original vectors
+RESCORE_OVERSAMPLING = float(os.getenv("QDRANT_RESCORE_OVERSAMPLING", "2.0"))
+# Named sparse (BM25) vector stored next to the unnamed dense one; Qdrant applies the IDF weighting
+SPARSE_VECTOR_NAME = "bm25"
+
+# Payload indexes backing the search filters, so filtered queries stay index-driven as the collection grows.
+# `location` holds {"lat", "lon"} (written next to lat/lng by the geocoder) for radius/bounding-box filters.
+PAYLOAD_INDEXES = {
+    "district": PayloadSchemaType.KEYWORD,
+    "collection": PayloadSchemaType.KEYWORD,
+    "quality_status": PayloadSchemaType.KEYWORD,
+    "vibeProfile": PayloadSchemaType.KEYWORD,
+    "location": PayloadSchemaType.GEO,
+    "lat": PayloadSchemaType.FLOAT,
+    "lng": PayloadSchemaType.FLOAT,
+    "influenceScore": PayloadSchemaType.FLOAT,
+    "quality_score": PayloadSchemaType.FLOAT,
+}
+
+
+def vector_params() -> VectorParams:
+    return VectorParams(size=VECTOR_DIM, distance=Distance.COSINE, on_disk=ON_DISK_VECTORS)
+
+def quantization_config():
+    if QUANTIZATION == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if QUANTIZATION == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def search_params():
+    """Query-time params: rescoring only matters (and is only sent) for quantized collections."""
+    if quantization_config() is None:
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=RESCORE_OVERSAMPLING))
+
+def create_collection(client, collection_name: str):
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vector_params(),
+        hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT),
+        quantization_config=quantization_config(),
+        on_disk_payload=ON_DISK_PAYLOAD,
+        sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)},
+    )
+    create_payload_indexes(client, collection_name)
+
+def create_payload_indexes(client, collection_name: str):
+    """Idempotent: creating an index that already exists is a no-op on the Qdrant side."""
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+
+def prepare_vector(vector):
+    """Truncates a full-size embedding to VECTOR_DIM. Cosine distance re-normalizes, so no rescaling is needed."""
+    vector = list(vector)
+    return vector[:VECTOR_DIM] if len(vector) > VECTOR_DIM else vector
+
+def has_sparse_vectors(collection_info) -> bool:
+    """Collections created before hybrid search have no sparse vector until migrate_collection.py rebuilds them."""
+    return SPARSE_VECTOR_NAME in (collection_info.config.params.sparse_vectors or {})
+
+def point_vectors(dense, sparse=None):
+    """Vector(s) for a PointStruct: the truncated dense vector, plus the BM25 vector when the collection has one."""
+    if sparse is None:
+        return prepare_vector(dense)
+    return {"": prepare_vector(dense), SPARSE_VECTOR_NAME: sparse}
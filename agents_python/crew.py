@@ -1,14 +1,24 @@
 import os
+import json
+import asyncio
 from langchain_community.tools.tavily_search import TavilySearchResults
 from crewai import Agent, LLM, Task, Crew, Process
+from crewai.hooks import register_before_llm_call_hook
 from dotenv import load_dotenv
 
 from crewai_tools import TavilySearchTool 
 
+from rate_limit import TokenBucket
+
 os.environ["OTEL_SDK_DISABLED"] = "true"
 
 load_dotenv()
 
+# Crews that can run at once; each is built once and reused for every event it handles
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "4"))
+# LLM calls per minute across all crews in the process (0 = unlimited)
+CREW_RPM = float(os.getenv("CREW_RPM", "30"))
+CREW_RPM_BURST = float(os.getenv("CREW_RPM_BURST", "5"))
 
 
 gateway_llm = LLM(
@@ -20,17 +30,27 @@ gateway_llm = LLM(
 # 1. Setting up Search Tool
 search_tool = TavilySearchTool(max_results=2)
 
-# 2. Defining the Specialist Agents
-def create_berlin_crew(event_raw_data: dict, output_model):
+# Shared rate limit, replacing the fact checker's own max_rpm. Crews run via kickoff_async, i.e. in
+# worker threads, so the blocking acquire() only ever holds up the crew that is over the limit.
+crew_llm_bucket = TokenBucket(CREW_RPM / 60, capacity=CREW_RPM_BURST) if CREW_RPM > 0 else None
+
+def throttle_llm_call(context):
+    crew_llm_bucket.acquire()
+    return None
+
+if crew_llm_bucket is not None:
+    register_before_llm_call_hook(throttle_llm_call)
+
+# 2. Defining the Specialist Agents (prompts are templates, filled in per event by kickoff(inputs=...))
+def build_berlin_crew(output_model) -> Crew:
     
     # AGENT 1: The Fact Checker (Verification)
     fact_checker = Agent(
         role='Senior Event Verifier',
-        goal=f"Verify if the event '{event_raw_data.get('eventName')}' is actually happening at {event_raw_data.get('venueName')}.",
+        goal="Verify if the event '{eventName}' is actually happening at {venueName}.",
         backstory="""You are a meticulous researcher. Your job is to prevent hallucinations. 
         You use search engines to cross-reference event dates, locations, and status.""",
         tools=[search_tool],
-        max_rpm=2,
         max_iter=3,
         max_tokens=2000,
         llm=gateway_llm, 
@@ -50,13 +70,13 @@ def create_berlin_crew(event_raw_data: dict, output_model):
 
     # 3. Defining the Tasks
     verify_task = Task(
-        description=f"Search for '{event_raw_data.get('eventName')}' in Berlin. Confirm if it exists and if the venue is correct.",
+        description="Search for '{eventName}' in Berlin. Confirm if it exists and if the venue is correct.",
         expected_output="A brief report confirming the event's validity and any corrected details.",
         agent=fact_checker
     )
 
     refine_task = Task(
-        description=f"Based on the verification and this raw data: {event_raw_data}, write a definitive Cultural Dossier.",
+        description="Based on the verification and this raw data: {raw_data}, write a definitive Cultural Dossier.",
         expected_output="A structured JSON object with event details and a high-quality summary. Return ONLY a valid JSON object. Do not include any markdown formatting, backticks, or introductory text. Start your response with '{' and end with '}'.",
         agent=cultural_critic,
         context=[verify_task],
@@ -68,4 +88,37 @@ def create_berlin_crew(event_raw_data: dict, output_model):
         agents=[fact_checker, cultural_critic],
         tasks=[verify_task, refine_task],
         process=Process.sequential # Fact check first, then criticize
-    )
\ No newline at end of file
+    )
+
+def crew_inputs(event_raw_data: dict) -> dict:
+    return {
+        "eventName": str(event_raw_data.get("eventName") or ""),
+        "venueName": str(event_raw_data.get("venueName") or ""),
+        "raw_data": json.dumps(event_raw_data, ensure_ascii=False, default=str),
+    }
+
+
+class CrewPool:
+    """Up to `size` prebuilt crews, handed out one per event. A crew's tasks hold the state of a run,
+    so a crew serves one event at a time; extra events wait for a crew to come back."""
+
+    def __init__(self, output_model, size: int = CREW_POOL_SIZE):
+        self.output_model = output_model
+        self.size = max(1, size)
+        self.built = 0
+        self._idle = None  # asyncio.Queue, created inside the running event loop
+
+    async def _acquire(self) -> Crew:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if self._idle.empty() and self.built < self.size:
+            self.built += 1
+            return build_berlin_crew(self.output_model)
+        return await self._idle.get()
+
+    async def kickoff(self, event_raw_data: dict):
+        crew = await self._acquire()
+        try:
+            return await crew.kickoff_async(inputs=crew_inputs(event_raw_data))
+        finally:
+            self._idle.put_nowait(crew)
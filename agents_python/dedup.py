@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+
+from collection_config import prepare_vector, search_params
+from vector_store import (
+    client, COLLECTION_NAME, FINGERPRINT_FIELDS, _normalize, event_key, event_point_id, fingerprint, get_embedding,
+    patch_payloads, vault_text,
+)
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dedup_index.db"),
+)
+# Cosine similarity above which a scrape at the same venue is treated as an event we already vaulted
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.93"))
+# Older entries go through the full pipeline again, so dossiers don't live on forever untouched
+DEDUP_MAX_AGE_DAYS = float(os.getenv("DEDUP_MAX_AGE_DAYS", "30"))
+# Scrape fields copied straight into the dossier; a change in any other field is left to the next full run
+PASSTHROUGH_FIELDS = ("district", "influenceScore", "confidenceScore")
+
+
+class DedupIndex:
+    """SQLite map from the key of a raw scrape to the point its processed dossier was vaulted under.
+    The crew may correct names and venues, so the raw key can differ from the point's own key."""
+
+    def __init__(self, path: str = DEDUP_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingested (
+                key TEXT PRIMARY KEY, point_id TEXT, raw TEXT, ingested_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns (point_id, raw scrape), or None when unknown or older than DEDUP_MAX_AGE_DAYS."""
+        with self._lock:
+            row = self._conn.execute("SELECT point_id, raw, ingested_at FROM ingested WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[2] > DEDUP_MAX_AGE_DAYS * 86400:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, point_id: str, raw: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?)",
+                (key, point_id, json.dumps(raw, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM ingested WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+dedup_index = DedupIndex()
+
+
+def stored_payload(point_id: str):
+    points = client.retrieve(collection_name=COLLECTION_NAME, ids=[point_id], with_payload=True, with_vectors=False)
+    return points[0].payload if points else None
+
+def refresh_passthrough(point_id: str, payload: dict, raw: dict, previous_raw: dict) -> list[str]:
+    """Patches the pass-through fields whose scraped value changed since the last ingest. Returns their names."""
+    changed = [f for f in PASSTHROUGH_FIELDS if f in raw and raw.get(f) != previous_raw.get(f)]
+    if changed:
+        dossier = {k: v for k, v in payload.items() if k not in FINGERPRINT_FIELDS}
+        dossier.update({f: raw[f] for f in changed})
+        # Only the payload changed. The stored content_hash stays: it may have been computed over the Baserow
+        # sync's embedding text, and recomputing it from vault_text would make that sync re-embed the point
+        dossier["payload_hash"] = fingerprint(dossier)
+        if "content_hash" in payload:
+            dossier["content_hash"] = payload["content_hash"]
+        patch_payloads([(point_id, dossier)])
+        payload.update({f: raw[f] for f in changed})
+    return changed
+
+async def nearest_same_venue(raw: dict):
+    """Vector probe: the closest vaulted event, if it is at the same venue and above DEDUP_SIMILARITY."""
+    vector = await get_embedding(vault_text(raw))
+    if not any(vector):
+        return None  # embedding failed, get_embedding returned its zero placeholder
+    response = await asyncio.to_thread(
+        client.query_points,
+        collection_name=COLLECTION_NAME, query=prepare_vector(vector), limit=1, with_payload=True,
+        search_params=search_params(),
+    )
+    if not response.points:
+        return None
+    best = response.points[0]
+    if best.score < DEDUP_SIMILARITY or _normalize((best.payload or {}).get("venueName")) != _normalize(raw.get("venueName")):
+        return None
+    return best
+
+async def find_duplicate(raw: dict):
+    """Dedup stage run before the expensive pipeline. Returns None for a new event, else a dict with
+    `match` ("exact" | "near"), `point_id`, the stored `dossier` and the `refreshed` pass-through fields."""
+    key = event_key(raw)
+    indexed = await asyncio.to_thread(dedup_index.get, key)
+    # Not in the index (e.g. vaulted before it existed): the scrape's own point ID is the next best guess,
+    # compared against the stored fields instead of the previous scrape
+    point_id, previous_raw = indexed if indexed is not None else (event_point_id(raw), None)
+    payload = await asyncio.to_thread(stored_payload, point_id)
+    if payload is not None:
+        refreshed = await asyncio.to_thread(refresh_passthrough, point_id, payload, raw, previous_raw or payload)
+        if refreshed or indexed is None:
+            await asyncio.to_thread(dedup_index.put, key, point_id, raw)
+        return {"match": "exact", "point_id": point_id, "dossier": payload, "refreshed": refreshed}
+    if indexed is not None:
+        # The point was deleted (or the vault write failed): process the event again
+        await asyncio.to_thread(dedup_index.delete, key)
+
+    best = await nearest_same_venue(raw)
+    if best is None:
+        return None
+    point_id = str(best.id)
+    # Remember the mapping so the next scrape of this listing is an exact hit. Pass-through fields are not
+    # compared here: the stored dossier came from a differently worded scrape
+    await asyncio.to_thread(dedup_index.put, key, point_id, raw)
+    return {"match": "near", "point_id": point_id, "dossier": best.payload or {}, "refreshed": [],
+            "similarity": round(best.score, 4)}
+
+async def remember(raw: dict, point_id: str):
+    await asyncio.to_thread(dedup_index.put, event_key(raw), point_id, raw)
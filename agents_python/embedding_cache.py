@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+
+# One cache file shared by the agent pipeline, the Baserow sync and the GraphQL backend
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "embedding_cache.db"),
+)
+# Least recently used vectors are evicted once the stored vectors exceed this size
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+class EmbeddingCache:
+    """On-disk (SQLite) cache of embedding vectors keyed by model, task type and normalized text.
+    Vectors are stored as packed float32 blobs and evicted LRU once the size budget is exceeded."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_mb: float = EMBEDDING_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_used REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, text: str, task_type: str = "") -> str:
+        return hashlib.sha256(f"{model}\x1f{task_type}\x1f{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str], task_type: str = "") -> list:
+        """Returns one entry per text: the cached vector, or None on a miss."""
+        keys = [self.key(model, t, task_type) for t in texts]
+        with self._lock:
+            found = {}
+            for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [array("f", found[k]).tolist() if k in found else None for k in keys]
+
+    def get(self, model: str, text: str, task_type: str = ""):
+        return self.get_many(model, [text], task_type)[0]
+
+    def put_many(self, model: str, texts: list[str], vectors: list, task_type: str = ""):
+        now = time.time()
+        rows = [(self.key(model, t, task_type), model, array("f", v).tobytes(), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            for key, _, blob, _ in rows:
+                old = self._conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self._bytes += len(blob) - (old[0] if old else 0)
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def put(self, model: str, text: str, vector, task_type: str = ""):
+        self.put_many(model, [text], [vector], task_type)
+
+    def _evict(self):
+        # Trim to 90% of the budget so we don't evict again on the very next write
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._bytes <= target:
+                break
+            doomed.append((key,))
+            self._bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+
+embedding_cache = EmbeddingCache()
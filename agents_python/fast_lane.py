@@ -0,0 +1,101 @@
+import os
+import json
+from collections import deque
+from litellm import acompletion
+from pydantic import ValidationError
+
+# "Fast lane": one structured-output call instead of the Tavily gatekeeper + two-agent crew.
+# off = never, trusted = only events from FAST_LANE_TRUSTED_SOURCES, all = every event
+FAST_LANE = os.getenv("FAST_LANE", "trusted").lower()
+FAST_LANE_TRUSTED_SOURCES = {
+    s.strip().lower()
+    for s in os.getenv(
+        "FAST_LANE_TRUSTED_SOURCES", "baserow,FebruaryEvents,MarchEvents,AprilEvents,ExhibitionEvents,FestivalEvents"
+    ).split(",")
+    if s.strip()
+}
+# Dossiers the model itself rates below this (confidenceScore, 0-10) go through the full crew
+FAST_LANE_MIN_CONFIDENCE = int(os.getenv("FAST_LANE_MIN_CONFIDENCE", "7"))
+FAST_LANE_MODEL = os.getenv("FAST_LANE_MODEL", "openai/berlin-crew-model")
+GATEWAY_URL = "http://localhost:4000/v1"
+LANE_STATS_WINDOW = int(os.getenv("LANE_STATS_WINDOW", "500"))
+
+
+def event_source(raw_data: dict) -> str:
+    return str(raw_data.get("source") or raw_data.get("collection") or raw_data.get("Collection") or "").lower()
+
+def choose_lane(raw_data: dict, requested: str = None) -> str:
+    """"fast" or "full". An explicit per-request lane wins over the FAST_LANE setting."""
+    if requested in ("fast", "full"):
+        return requested
+    if FAST_LANE == "all" or (FAST_LANE == "trusted" and event_source(raw_data) in FAST_LANE_TRUSTED_SOURCES):
+        return "fast"
+    return "full"
+
+def _json_block(text: str) -> str:
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end != -1 else text
+
+async def fast_dossier(raw_data: dict, output_model):
+    """One LLM call that writes the dossier directly. Returns (dossier dict, None) or, when the
+    full crew should take over, (None, reason)."""
+    prompt = (
+        f"Raw event data scraped from a trusted Berlin listing:\n{json.dumps(raw_data, ensure_ascii=False, default=str)}\n\n"
+        "Write a definitive Cultural Dossier for it. Keep the facts of the listing; the summary must be EXACTLY "
+        "1-2 evocative, culturally accurate sentences and the vibeProfile a short list of precise genre/mood tags. "
+        "Set confidenceScore (0-10) to how sure you are the details are complete and correct.\n"
+        f"Return ONLY a JSON object matching this schema:\n{json.dumps(output_model.model_json_schema())}"
+    )
+    try:
+        response = await acompletion(
+            model=FAST_LANE_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a Berlin cultural critic who writes structured event dossiers."},
+                {"role": "user", "content": prompt},
+            ],
+            base_url=GATEWAY_URL,
+            api_key="sk-1234",
+            response_format={"type": "json_object"},
+        )
+        content = response.choices[0].message.content or ""
+    except Exception as e:
+        return None, f"fast lane call failed: {str(e)[:100]}"
+
+    try:
+        dossier = output_model.model_validate_json(_json_block(content))
+    except ValidationError as e:
+        return None, f"validation failed: {e.error_count()} error(s)"
+    if dossier.confidenceScore < FAST_LANE_MIN_CONFIDENCE:
+        return None, f"low confidence ({dossier.confidenceScore} < {FAST_LANE_MIN_CONFIDENCE})"
+    return dossier.model_dump(), None
+
+
+def percentile(values, q: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+class LaneLatency:
+    """End-to-end pipeline latency per lane ("fast", "full", "escalated": fast attempt + full crew)."""
+
+    def __init__(self, window: int = LANE_STATS_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+
+    def record(self, lane: str, seconds: float):
+        self.samples.setdefault(lane, deque(maxlen=self.window)).append(seconds)
+        self.counts[lane] = self.counts.get(lane, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            lane: {
+                "events": self.counts[lane],
+                "p50_s": round(percentile(samples, 0.5), 3),
+                "p95_s": round(percentile(samples, 0.95), 3),
+            }
+            for lane, samples in self.samples.items()
+        }
+
+
+lane_latency = LaneLatency()
@@ -0,0 +1,82 @@
+import os
+import time
+import sqlite3
+import threading
+from geopy.geocoders import Nominatim
+
+from rate_limit import TokenBucket
+
+GEOCODE_CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "geocode_cache.db"),
+)
+# Found venues rarely move; misses are retried sooner in case the listing/OSM data improves
+GEOCODE_TTL_DAYS = float(os.getenv("GEOCODE_TTL_DAYS", "90"))
+GEOCODE_NEGATIVE_TTL_DAYS = float(os.getenv("GEOCODE_NEGATIVE_TTL_DAYS", "7"))
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_RATE_PER_SEC = float(os.getenv("NOMINATIM_RATE_PER_SEC", "1"))
+
+geolocator = Nominatim(user_agent="berlin_event_agent", timeout=10)
+
+
+class GeocodeCache:
+    """SQLite venue -> coordinate cache with TTLs. Misses are cached too (lat/lng NULL)."""
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                key TEXT PRIMARY KEY, lat REAL, lng REAL, fetched_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns (found, coords): found is False when the key isn't cached or has expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT lat, lng, fetched_at FROM geocodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        lat, lng, fetched_at = row
+        ttl_days = GEOCODE_TTL_DAYS if lat is not None else GEOCODE_NEGATIVE_TTL_DAYS
+        if time.time() - fetched_at > ttl_days * 86400:
+            return False, None
+        return True, (lat, lng) if lat is not None else None
+
+    def put(self, key: str, coords):
+        lat, lng = coords if coords else (None, None)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)", (key, lat, lng, time.time()))
+            self._conn.commit()
+
+
+geocode_cache = GeocodeCache()
+nominatim_bucket = TokenBucket(NOMINATIM_RATE_PER_SEC)
+
+
+def location_key(venue, district) -> str:
+    return f"{' '.join((venue or '').lower().split())}|{' '.join((district or '').lower().split())}"
+
+def get_coords(venue, district):
+    """Returns (lat, lng) for a venue, or None when it can't be placed ("various" venues, misses, errors).
+    Served from the persistent cache when possible; only real Nominatim calls are rate limited."""
+    venue = venue or ""
+    district = district or "Berlin"
+    if "various" in venue.lower() or not venue:
+        print(f"Various venues detected for {district}, leaving it unplaced.")
+        return None
+
+    key = location_key(venue, district)
+    cached, coords = geocode_cache.get(key)
+    if not cached:
+        try:
+            nominatim_bucket.acquire()
+            location = geolocator.geocode(f"{venue}, {district}, Berlin, Germany")
+            coords = (location.latitude, location.longitude) if location else None
+            geocode_cache.put(key, coords)
+        except Exception as e:
+            # Transient errors are not cached, the next run retries them
+            print(f"Geocoding error: {e}")
+            coords = None
+    return coords
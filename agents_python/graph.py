@@ -1,36 +1,176 @@
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, END
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
 import os
+import re
+import json
+import math
+import time
+import sqlite3
+import asyncio
+import threading
+from metrics import span
+
+VERIFICATION_CACHE_PATH = os.getenv(
+    "VERIFICATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "verification_cache.db"),
+)
+# n8n re-scrapes the same listings often; a found event stays verified for a week, a miss is retried after a day
+VERIFICATION_TTL_DAYS = float(os.getenv("VERIFICATION_TTL_DAYS", "7"))
+VERIFICATION_NEGATIVE_TTL_DAYS = float(os.getenv("VERIFICATION_NEGATIVE_TTL_DAYS", "1"))
+# Search rounds per event: the first round, then refined phrasings while still unverified
+VERIFY_MAX_ITERATIONS = int(os.getenv("VERIFY_MAX_ITERATIONS", "2"))
 
 # 1. Defining the State (what data moves through the graph)
 class AgentState(TypedDict):
     event_data: dict
-    verifications: List[str]
+    verifications: List[str]  # URLs of search results that mention the event
     is_verified: bool
     iterations: int
+    cache_hit: bool
+    search_failed: bool  # every query of the last round errored: no outcome, nothing cached
+
+
+class VerificationCache:
+    """SQLite cache of verification outcomes, keyed by normalized event name and venue."""
+
+    def __init__(self, path: str = VERIFICATION_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verifications (
+                key TEXT PRIMARY KEY, verified INTEGER, sources TEXT, checked_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns (verified, sources), or None when the key isn't cached or has expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verified, sources, checked_at FROM verifications WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        verified, sources, checked_at = row
+        ttl_days = VERIFICATION_TTL_DAYS if verified else VERIFICATION_NEGATIVE_TTL_DAYS
+        if time.time() - checked_at > ttl_days * 86400:
+            return None
+        return bool(verified), json.loads(sources)
+
+    def put(self, key: str, verified: bool, sources: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verifications VALUES (?, ?, ?, ?)",
+                (key, int(verified), json.dumps(sources), time.time()),
+            )
+            self._conn.commit()
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+def verification_key(event: dict) -> str:
+    return f"{_normalize(event.get('eventName'))}|{_normalize(event.get('venueName'))}"
+
+def query_phrasings(event: dict, iteration: int) -> List[str]:
+    name = event.get("eventName") or ""
+    venue = event.get("venueName") or ""
+    if iteration == 0:
+        phrasings = [
+            f"Berlin event {name} at {venue} date verification",
+            f'"{name}" {venue} Berlin',
+            f"{name} Berlin {event.get('date') or ''}".strip(),
+        ]
+    else:
+        # Refine: scraped venue names are often off, so search on the name alone and on the venue's programme
+        phrasings = [f'"{name}" Berlin', f"{name} Berlin tickets", f"{venue} Berlin programm {name}"]
+    return list(dict.fromkeys(phrasings))
+
+def mentions_event(result: dict, name_tokens: List[str]) -> bool:
+    if not name_tokens:
+        return True
+    text = f"{result.get('title') or ''} {result.get('content') or ''}".lower()
+    found = sum(1 for token in name_tokens if token in text)
+    return found >= math.ceil(0.6 * len(name_tokens))
+
+
+def build_verifier_graph(search_client=None, cache=None):
+    """Compiles the verification graph. `search_client` needs an async `search(query, search_depth=...)`
+    returning Tavily-shaped results ({"results": [{"url", "title", "content"}, ...]}); tests pass a stub."""
+    search_client = search_client or AsyncTavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
+    cache = cache or VerificationCache()
+
+    # 2. Node: Cached outcome from an earlier scrape of the same event
+    async def cache_lookup_node(state: AgentState):
+        cached = await asyncio.to_thread(cache.get, verification_key(state["event_data"]))
+        if cached is None:
+            return {"cache_hit": False}
+        verified, sources = cached
+        return {"cache_hit": True, "is_verified": verified, "verifications": sources}
+
+    async def timed_search(query: str, depth: str):
+        with span("tavily"):
+            return await search_client.search(query=query, search_depth=depth)
+
+    # 3. Node: Verification Logic, all phrasings of a round searched concurrently
+    async def verify_event_node(state: AgentState):
+        event = state["event_data"]
+        iteration = state.get("iterations", 0)
+        queries = query_phrasings(event, iteration)
+        depth = "basic" if iteration == 0 else "advanced"
+        responses = await asyncio.gather(*(timed_search(q, depth) for q in queries), return_exceptions=True)
+
+        name_tokens = [t for t in re.findall(r"\w+", _normalize(event.get("eventName"))) if len(t) > 2]
+        sources = list(state.get("verifications") or [])
+        failed = 0
+        for response in responses:
+            if isinstance(response, Exception):
+                print(f"Verification search failed: {response}")
+                failed += 1
+                continue
+            for result in response.get("results", []):
+                url = result.get("url")
+                if mentions_event(result, name_tokens) and url and url not in sources:
+                    sources.append(url)
+
+        return {
+            "verifications": sources,
+            "is_verified": bool(sources),
+            "iterations": iteration + 1,
+            "search_failed": failed == len(responses),
+        }
+
+    # 4. Node: Remember the outcome so repeated scrapes skip the web search
+    async def store_node(state: AgentState):
+        if not state.get("search_failed"):
+            await asyncio.to_thread(
+                cache.put, verification_key(state["event_data"]), state["is_verified"], state["verifications"]
+            )
+        return {}
+
+    def after_cache(state: AgentState):
+        return END if state.get("cache_hit") else "verifier"
+
+    # Conditional Edge: unverified events get another round with refined phrasings.
+    # A round where every search errored says nothing about the event: stop without caching it
+    def after_verify(state: AgentState):
+        if state.get("search_failed") and not state["is_verified"]:
+            return END
+        if state["is_verified"] or state["iterations"] >= VERIFY_MAX_ITERATIONS:
+            return "store"
+        return "verifier"
+
+    # 5. Create the Graph
+    workflow = StateGraph(AgentState)
+    workflow.add_node("cache_lookup", cache_lookup_node)
+    workflow.add_node("verifier", verify_event_node)
+    workflow.add_node("store", store_node)
+    workflow.set_entry_point("cache_lookup")
+    workflow.add_conditional_edges("cache_lookup", after_cache)
+    workflow.add_conditional_edges("verifier", after_verify)
+    workflow.add_edge("store", END)
+    return workflow.compile()
+
 
-tavily = TavilyClient(api_key=os.environ.get("TAVILY_API_KEY"))
-
-# 2. Node: Verification Logic
-def verify_event_node(state: AgentState):
-    event = state['event_data']
-    query = f"Berlin event {event['eventName']} at {event['venueName']} date verification"
-    
-    # Automatic search
-    search_results = tavily.search(query=query, search_depth="basic")
-    
-    # If search finds matches, mark as verified
-    state['is_verified'] = len(search_results) > 0
-    state['iterations'] += 1
-    return state
-
-# 3. Create the Graph
-workflow = StateGraph(AgentState)
-workflow.add_node("verifier", verify_event_node)
-workflow.set_entry_point("verifier")
-
-# Conditional Edge: If not verified, we could route back to Mastra
-workflow.add_edge("verifier", END)
-
-app_graph = workflow.compile()
\ No newline at end of file
+app_graph = build_verifier_graph()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import threading
+
+from metrics import Histogram, registry
+
+# Durable ingestion queue: POST /validate-and-store only enqueues, workers drain the jobs
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingest_jobs.db"),
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # workers inside the API process; 0 = enqueue only (see worker.py)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "4"))
+# Retry n waits JOB_BACKOFF_SECONDS * 2^(n-1) (+-20% jitter), capped at JOB_MAX_BACKOFF_SECONDS
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "10"))
+JOB_MAX_BACKOFF_SECONDS = float(os.getenv("JOB_MAX_BACKOFF_SECONDS", "600"))
+# A running job whose worker died (crash, restart) is picked up again once its lease runs out
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+# While a job runs its worker keeps extending the lease, so only a dead worker's job is reclaimed
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 3)))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+# queued -> running -> done, or back to queued (retry) until the attempts run out -> dead (dead letter)
+JOB_STATUSES = ("queued", "running", "done", "dead")
+
+queue_wait_seconds = registry.add(Histogram(
+    "job_queue_wait_seconds", "Time from enqueue (or retry) until a worker picks the job up.", ()
+))
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    """SQLite-backed job queue. Claims are leases, so several worker processes can share one file
+    and a job is never lost to a crashed worker."""
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, status TEXT, payload TEXT, attempts INTEGER, max_attempts INTEGER,
+                run_after REAL, lease_until REAL, result TEXT, error TEXT, created_at REAL, updated_at REAL,
+                lease_token TEXT
+            )
+        """)
+        if "lease_token" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")  # queue files from before leases had tokens
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_after)")
+        self._wakeup = None  # asyncio.Event of the loop the workers run on
+        self._loop = None
+
+    def enqueue(self, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs VALUES (?, 'queued', ?, 0, ?, ?, NULL, NULL, NULL, ?, ?, NULL)",
+                (job_id, json.dumps(payload, default=str), max_attempts, now, now, now),
+            )
+        self._notify()
+        return job_id
+
+    def _notify(self):
+        """Wakes an idle worker. Safe from any thread: enqueue and retry usually run in asyncio.to_thread."""
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # the workers' loop has shut down
+
+    def claim(self):
+        """Leases the next due job to the caller: {"id", "payload", "attempts", "max_attempts", "lease_token"} or None.
+        The token identifies this claim: once the job is reclaimed, the old worker can no longer write its outcome."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute("""
+                        SELECT id, payload, attempts, max_attempts, status, run_after FROM jobs
+                        WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)
+                        ORDER BY run_after LIMIT 1
+                    """, (now, now)).fetchone()
+                    if row is None:
+                        break
+                    job_id, payload, attempts, max_attempts, status, run_after = row
+                    if attempts >= max_attempts:
+                        # Its last attempt died with the worker
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'dead', error = ?, updated_at = ? WHERE id = ?",
+                            ("Worker lease expired on the last attempt.", now, job_id),
+                        )
+                        continue
+                    lease_token = uuid.uuid4().hex
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = ?, lease_until = ?, lease_token = ?, updated_at = ? "
+                        "WHERE id = ?", (attempts + 1, now + JOB_LEASE_SECONDS, lease_token, now, job_id),
+                    )
+                    self._conn.execute("COMMIT")
+                    if status == "queued":
+                        queue_wait_seconds.observe(now - run_after)
+                    return {"id": job_id, "payload": json.loads(payload), "attempts": attempts + 1,
+                            "max_attempts": max_attempts, "lease_token": lease_token}
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def renew(self, job: dict) -> bool:
+        """Extends the lease of a running job. False once the job has been reclaimed by another worker."""
+        now = time.time()
+        with self._lock:
+            return bool(self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_token = ?",
+                (now + JOB_LEASE_SECONDS, now, job["id"], job["lease_token"]),
+            ).rowcount)
+
+    def complete(self, job: dict, result: dict) -> bool:
+        """Stores the result. False (and nothing written) if the lease was lost to another worker."""
+        with self._lock:
+            return bool(self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_until = NULL, lease_token = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND lease_token = ?",
+                (json.dumps(result, default=str), time.time(), job["id"], job["lease_token"]),
+            ).rowcount)
+
+    def fail(self, job: dict, error: str):
+        """Schedules a retry with backoff, or dead-letters the job once its attempts are used up.
+        Returns the new status, or None if the lease was lost to another worker."""
+        now = time.time()
+        dead = job["attempts"] >= job["max_attempts"]
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, lease_until = NULL, lease_token = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND lease_token = ?",
+                ("dead" if dead else "queued", now if dead else now + backoff_seconds(job["attempts"]), error[:1000],
+                 now, job["id"], job["lease_token"]),
+            ).rowcount
+        if not updated:
+            return None
+        return "dead" if dead else "queued"
+
+    def retry(self, job_id: str) -> bool:
+        """Puts a dead-lettered job back in the queue with a fresh set of attempts."""
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'dead'", (now, now, job_id),
+            ).rowcount
+        if updated:
+            self._notify()
+        return bool(updated)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT id, status, attempts, max_attempts, run_after, result, error, created_at, updated_at
+                FROM jobs WHERE id = ?
+            """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, status, attempts, max_attempts, run_after, result, error, created_at, updated_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "attempts": attempts,
+            "max_attempts": max_attempts,
+            "next_attempt_at": run_after if status == "queued" else None,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "error": error,
+            "result": json.loads(result) if result else None,
+        }
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATUSES}
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                renewed = await asyncio.to_thread(self.renew, job)
+            except Exception as e:
+                print(f"Job {job['id']} lease renewal failed, retrying: {e}")
+                continue
+            if not renewed:
+                print(f"Job {job['id']} lost its lease (reclaimed after it expired); its outcome will be discarded")
+                return
+
+    async def _run(self, job: dict, handler):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await handler(job["payload"])
+        except Exception as e:
+            outcome = await asyncio.to_thread(self.fail, job, f"{type(e).__name__}: {e}")
+            print(f"Job {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}, "
+                  f"now {outcome or 'reclaimed by another worker'}): {e}")
+            return
+        finally:
+            heartbeat.cancel()
+        if not await asyncio.to_thread(self.complete, job, result):
+            print(f"Job {job['id']} finished after its lease was lost; result discarded")
+
+    async def worker(self, handler):
+        """Runs handler(payload) for claimed jobs until cancelled. An exception from the handler is a failed attempt."""
+        if self._loop is not asyncio.get_running_loop():
+            self._wakeup = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job = await asyncio.to_thread(self.claim)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                await self._run(job, handler)
+            except Exception as e:
+                # e.g. "database is locked" while other worker processes hold the file. A job whose outcome
+                # couldn't be written stays leased and is picked up again when the lease expires
+                print(f"Job queue error, backing off: {e}")
+                await asyncio.sleep(JOB_POLL_SECONDS)
+
+    async def run_workers(self, handler, count: int = JOB_WORKERS):
+        await asyncio.gather(*(self.worker(handler) for _ in range(count)))
+
+    def metric_families(self) -> list[tuple]:
+        return [("ingest_jobs", "gauge", "Ingestion jobs by status.",
+                 [({"status": status}, n) for status, n in self.counts().items()])]
+
+
+job_queue = JobQueue()
+registry.register_collector(job_queue.metric_families)
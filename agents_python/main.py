@@ -1,19 +1,39 @@
 import os
 import json
+import time
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
+from typing import Optional
 from litellm import completion
 import uvicorn
 
-from vector_store import init_db, save_to_vault
-from crew import create_berlin_crew
-from evals import run_quality_check
+from vector_store import init_db, save_to_vault, event_point_id, FINGERPRINT_FIELDS
+from dedup import find_duplicate, remember, DEDUP_ENABLED
+from fast_lane import choose_lane, fast_dossier, lane_latency
+from crew import CrewPool
+from evals import evaluate
 from graph import app_graph
+from metrics import instrument, registry, span
+from job_queue import job_queue, JOB_WORKERS
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ingestion workers share the event loop with the API; JOB_WORKERS=0 leaves the queue to worker.py
+    workers = asyncio.create_task(job_queue.run_workers(run_job, JOB_WORKERS)) if JOB_WORKERS > 0 else None
+    yield
+    if workers is not None:
+        workers.cancel()  # jobs cut off mid-run are picked up again once their lease expires
+
+
+app = FastAPI(lifespan=lifespan)
+instrument(app)
 init_db()
 
 import json
@@ -52,79 +72,152 @@ class CulturalDossier(BaseModel):
     confidenceScore: int = Field(ge=0, le=10)
     summary: str
 
+# Agents, tasks and the gateway LLM are built once per pooled crew, not per event
+crew_pool = CrewPool(CulturalDossier)
+
 @app.exception_handler(Exception)
 async def universal_exception_shield(request: Request, exc: Exception):
-    # This catches the OpenAIException and returns a valid JSON so n8n doesn't stop
+    # Unhandled errors are real failures: log them and let the caller (n8n, a job poller) see a 500
+    traceback.print_exception(type(exc), exc, exc.__traceback__)
     return JSONResponse(
-        status_code=200, # Force success
-        content={
-            "score": 1.0, 
-            "passed": True, 
-            "reason": "Internal audit crash handled gracefully."
-        }
+        status_code=500,
+        content={"status": "error", "error": f"{type(exc).__name__}: {str(exc)[:200]}"}
     )
 
-@app.post("/validate-and-store")
-async def validate_and_store(raw_data: dict):
+# Max number of events whose graph -> crew -> eval -> vault pipelines run at once in a batch
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+
+
+async def check_duplicate(raw_data: dict, force: bool):
+    """Returns (dedup status for the response, stored dossier or None)."""
+    if force or not DEDUP_ENABLED:
+        return {"match": "skipped"}, None
+    try:
+        duplicate = await find_duplicate(raw_data)
+    except Exception as e:
+        print(f"Dedup check failed, processing as new: {e}")
+        return {"match": "none"}, None
+    if duplicate is None:
+        return {"match": "none"}, None
+    dossier = {k: v for k, v in duplicate.pop("dossier").items() if k not in FINGERPRINT_FIELDS}
+    return duplicate, dossier
+
+
+async def process_event(raw_data: dict, force: bool = False, lane: str = None, shield: bool = True) -> dict:
+    """Runs one raw event through the pipeline and returns the response payload.
+    Events already in the vault are answered from it unless force=True. Events in the fast lane
+    (see fast_lane.py) get their dossier from a single LLM call and only escalate to the crew if needed.
+    The blocking CrewAI stage runs in worker threads so the event loop stays free.
+    With shield=False a pipeline error is raised instead of vaulting the partial dossier, so a queued job can retry."""
     print(f"Python received data: {raw_data.get('eventName')}")
     current_dossier_data = {"eventName": raw_data.get("eventName", "Unknown")}
+
+    # STEP 0: DEDUP (n8n re-scrapes the same listings daily; those skip Tavily, the crew and the judge)
+    with span("dedup"):
+        dedup_status, stored_dossier = await check_duplicate(raw_data, force)
+    if stored_dossier is not None:
+        print(f"Duplicate ({dedup_status['match']}) of a vaulted event: {raw_data.get('eventName')}")
+        return {
+            "status": "duplicate",
+            "dedup": dedup_status,
+            "quality_passed": stored_dossier.get("quality_status") != "flagged",
+            "quality_score": stored_dossier.get("quality_score"),
+            "data": stored_dossier
+        }
+
+    lane = choose_lane(raw_data, lane)
+    escalation_reason = None
+    verification_cached = False
+    started = time.perf_counter()
     
     try:
-        # GRAPH GATEKEEPER (Tavily Verification)
-        print("Step 1: Running Graph Gatekeeper...")
-        initial_state = {
-            "event_data": raw_data,
-            "verifications": [],
-            "is_verified": False,
-            "iterations": 0
-        }
-        
-        # Invoking the LangGraph workflow
-        graph_result = app_graph.invoke(initial_state)
-        
-        if not graph_result.get("is_verified"):
-            print(f"Graph rejected event: {raw_data.get('eventName')} (Not found on web)")
-            return {
-                "status": "rejected", 
-                "reason": "Event could not be verified via Tavily search."
+        fast_result = None
+        if lane == "fast":
+            # FAST LANE: one structured-output call, validated by pydantic
+            print("Step 1: Fast lane dossier...")
+            with span("fast_lane"):
+                fast_result, escalation_reason = await fast_dossier(raw_data, CulturalDossier)
+            if fast_result is None:
+                print(f"Fast lane escalating to the crew: {escalation_reason}")
+                lane = "escalated"
+
+        if fast_result is not None:
+            current_dossier_data = fast_result
+        else:
+            # GRAPH GATEKEEPER (Tavily Verification)
+            print("Step 1: Running Graph Gatekeeper...")
+            initial_state = {
+                "event_data": raw_data,
+                "verifications": [],
+                "is_verified": False,
+                "iterations": 0,
+                "cache_hit": False,
+                "search_failed": False
             }
+            
+            # Invoking the LangGraph workflow (async: its searches run concurrently on the event loop)
+            with span("verify"):
+                graph_result = await app_graph.ainvoke(initial_state)
+            verification_cached = graph_result.get("cache_hit", False)
+            if graph_result.get("search_failed") and not graph_result.get("is_verified"):
+                # A search outage is not a "not found": fail the run (shielded inline, retried when queued)
+                raise RuntimeError("Verification searches all failed, event could not be checked.")
+            
+            if not graph_result.get("is_verified"):
+                print(f"Graph rejected event: {raw_data.get('eventName')} (Not found on web)")
+                return {
+                    "status": "rejected", 
+                    "reason": "Event could not be verified via Tavily search.",
+                    "lane": lane,
+                    "escalation_reason": escalation_reason,
+                    "dedup": dedup_status,
+                    "verification_cached": verification_cached
+                }
 
-        # CREWAI SPECIALISTS (Research & Polish)
-        print("Step 2: Kicking off CrewAI Specialists...")
-        berlin_crew = create_berlin_crew(raw_data, CulturalDossier)
-        try:
-            result = berlin_crew.kickoff()
-            dossier = result.pydantic
-            current_dossier_data = dossier.model_dump()
-        except Exception as crew_err:
-            print(f"CrewAI Parsing failed, attempting manual repair: {crew_err}")
-            # If crewai fails, it often leaves the raw string in the error or logs
-            # We use the repair tool on the raw output if available
-            raw_output = str(crew_err) 
-            current_dossier_data = universal_json_repair(raw_output)
+            # CREWAI SPECIALISTS (Research & Polish)
+            print("Step 2: Kicking off CrewAI Specialists...")
+            try:
+                with span("crew"):
+                    result = await crew_pool.kickoff(raw_data)
+                dossier = result.pydantic
+                current_dossier_data = dossier.model_dump()
+            except Exception as crew_err:
+                print(f"CrewAI Parsing failed, attempting manual repair: {crew_err}")
+                # If crewai fails, it often leaves the raw string in the error or logs
+                # We use the repair tool on the raw output if available
+                raw_output = str(crew_err) 
+                current_dossier_data = universal_json_repair(raw_output)
 
         # STEP 3: DEEPEVAL QUALITY CHECK
-        eval_result = run_quality_check(
-            original_scrape=str(raw_data), 
-            agent_output=current_dossier_data.get("summary", "No summary available.")
-        )
+        with span("deepeval"):
+            eval_result = await evaluate(
+                original_scrape=str(raw_data), 
+                agent_output=current_dossier_data.get("summary", "No summary available.")
+            )
         
         # STEP 4: MERGE & STORAGE
         current_dossier_data["quality_score"] = eval_result["score"]
         current_dossier_data["quality_reason"] = eval_result["reason"]
         current_dossier_data["quality_status"] = "verified" if eval_result["passed"] else "flagged"
 
-        await save_to_vault(current_dossier_data)
+        with span("vault"):
+            await save_to_vault(current_dossier_data)
+            await remember(raw_data, event_point_id(current_dossier_data))
         
         return {
             "status": "processed", 
+            "lane": lane,
+            "escalation_reason": escalation_reason,
+            "dedup": dedup_status,
+            "verification_cached": verification_cached,
             "quality_passed": eval_result["passed"],
             "quality_score": eval_result["score"],
             "data": current_dossier_data
         }
         
     except Exception as e:
-        
+        if not shield:
+            raise
         print(f"🛡️ Shielding Pipeline from Error: {e}")
         current_dossier_data["quality_score"] = 0.5  # Neutral score for "Rescued" data
         current_dossier_data["quality_status"] = "rescued"
@@ -137,15 +230,94 @@ async def validate_and_store(raw_data: dict):
             print(f"Failed to save even partial data: {save_error}")
 
 
-        return JSONResponse(
-            status_code=200, 
-            content={
-                "status": "error_shielded",
-                "quality_passed": True, 
-                "quality_score": 1.0,
-                "data": current_dossier_data # Returns whatever we managed to scrap together
-            }
-        )
+        return {
+            "status": "error_shielded",
+            "lane": lane,
+            "quality_passed": True, 
+            "quality_score": 1.0,
+            "data": current_dossier_data # Returns whatever we managed to scrap together
+        }
+    finally:
+        lane_latency.record(lane, time.perf_counter() - started)
+
+
+async def run_job(payload: dict) -> dict:
+    """Queue handler: a raised error is a failed attempt (retried with backoff, then dead-lettered)."""
+    return await process_event(payload["event"], force=payload["force"], lane=payload["lane"], shield=False)
+
+
+@app.post("/validate-and-store", status_code=202)
+async def validate_and_store(raw_data: dict, force: bool = False, lane: Optional[str] = None, wait: bool = False):
+    """Queues the event and answers 202 with its job id; poll GET /jobs/{id} for the result.
+    wait=true runs the pipeline inside the request instead (the old synchronous behaviour)."""
+    if wait:
+        return JSONResponse(await process_event(raw_data, force=force, lane=lane))
+    job_id = await asyncio.to_thread(job_queue.enqueue, {"event": raw_data, "force": force, "lane": lane})
+    print(f"Queued job {job_id}: {raw_data.get('eventName')}")
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"},
+        headers={"Location": f"/jobs/{job_id}"}
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """queued | running | done (with the pipeline result) | dead (retries used up, with the last error)."""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job
+
+
+@app.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    """Re-queues a dead-lettered job with a fresh set of attempts."""
+    if not await asyncio.to_thread(job_queue.retry, job_id):
+        raise HTTPException(status_code=409, detail="Only dead-lettered jobs can be retried.")
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.post("/validate-and-store/batch")
+async def validate_and_store_batch(raw_events: list[dict], concurrency: int = INGEST_CONCURRENCY, stream: bool = True,
+                                   force: bool = False, lane: Optional[str] = None):
+    """Runs many events concurrently (bounded by `concurrency`).
+    With stream=true, results are sent as NDJSON lines in completion order, each tagged with its input index."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index: int, raw_data: dict):
+        async with semaphore:
+            result = await process_event(raw_data, force=force, lane=lane)
+        return {"index": index, **result}
+
+    tasks = [asyncio.create_task(run_one(i, event)) for i, event in enumerate(raw_events)]
+    print(f"Batch received: {len(tasks)} events (concurrency={concurrency})")
+
+    if not stream:
+        results = await asyncio.gather(*tasks)
+        return {"count": len(results), "results": results}
+
+    async def result_lines():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, default=str) + "\n"
+        finally:
+            # Client went away mid-stream: don't leave orphaned pipelines running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+def lane_metrics():
+    return [("pipeline_events_total", "counter", "Events run through the pipeline by lane (duplicates excluded).",
+             [({"lane": lane}, count) for lane, count in lane_latency.counts.items()])]
+
+registry.register_collector(lane_metrics)
+
+@app.get("/lane-stats")
+async def lane_stats():
+    """p50/p95 end-to-end latency per lane (duplicates excluded)."""
+    return lane_latency.stats()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, loop="asyncio")
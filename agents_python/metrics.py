@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Match
+
+# Prometheus text-format metrics and per-request timing spans, shared by the agent pipeline and the GraphQL backend.
+# Requests slower than this are logged as one JSON line with their stage breakdown (0 = off)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: dict) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}" if labels else ""
+
+def _number(value) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {values[-2]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # callables returning [(name, type, help, [(labels, value), ...]), ...] at scrape time
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples if value is not None]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_seconds = registry.add(Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the last byte of the response.",
+    ("method", "path", "status")
+))
+stage_seconds = registry.add(Histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request (embedding, qdrant, llm, tavily, ...).",
+    ("stage",)
+))
+stage_errors = registry.add(Counter("stage_errors_total", "Stages that ended with an exception.", ("stage",)))
+
+# Stages of the request being served; tasks spawned by it (gather, create_task) inherit the same list
+_current_stages = contextvars.ContextVar("current_stages", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Times a block as `stage`: feeds the stage histogram and the current request's breakdown."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:  # not cancellations or a closed stream
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        stages = _current_stages.get()
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+def stage_breakdown(stages: list) -> dict:
+    """Total milliseconds and count per stage (concurrent spans of one stage add up)."""
+    breakdown = {}
+    for stage, elapsed in stages:
+        entry = breakdown.setdefault(stage, {"ms": 0.0, "count": 0})
+        entry["ms"] += 1000 * elapsed
+        entry["count"] += 1
+    return {stage: {"ms": round(e["ms"], 1), "count": e["count"]} for stage, e in breakdown.items()}
+
+
+class MetricsMiddleware:
+    """ASGI middleware: times every HTTP request until its response is fully sent (so streamed
+    responses count in full), labels it by route template, and logs slow requests."""
+
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = routes
+
+    def route_path(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"  # keeps 404 scans from creating a series per URL
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stages = []
+        token = _current_stages.set(stages)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_stages.reset(token)
+            elapsed = time.perf_counter() - started
+            path = self.route_path(scope)
+            request_seconds.observe(elapsed, method=scope["method"], path=path, status=status)
+            if SLOW_REQUEST_MS and 1000 * elapsed >= SLOW_REQUEST_MS:
+                print(json.dumps({
+                    "slow_request": path, "method": scope["method"], "status": status,
+                    "ms": round(1000 * elapsed, 1), "stages": stage_breakdown(stages)
+                }))
+
+def instrument(app):
+    """Adds the timing middleware and GET /metrics (Prometheus text format) to a FastAPI app."""
+    app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request):
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,82 @@
+# Rebuilds berlin_events into the layout configured in collection_config.py, reusing the stored
+# vectors (no re-embedding). BM25 sparse vectors are computed locally from the payloads.
+# The new physical collection is published under the berlin_events alias.
+# Pause ingestion/syncs while it runs: points written to the old collection mid-copy are not carried over.
+#
+# Usage: python migrate_collection.py [--batch-size 256] [--keep-old]
+import argparse
+import time
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, PointStruct,
+)
+
+from collection_config import create_collection, point_vectors, VECTOR_DIM
+from sparse_encoder import encode_document
+from vector_store import client, COLLECTION_NAME
+
+
+def resolve_physical_collection(name: str):
+    """Returns (physical collection, is_alias) for the name the app reads and writes."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name, True
+    return name, False
+
+def dense_vector(vector):
+    # Collections that already have a sparse vector return named vectors; the dense one is ""
+    return vector[""] if isinstance(vector, dict) else vector
+
+def migrate(batch_size: int = 256, keep_old: bool = False):
+    source, is_alias = resolve_physical_collection(COLLECTION_NAME)
+    target = f"{COLLECTION_NAME}_{int(time.time())}"
+    print(f"Migrating {source} -> {target} (dim {VECTOR_DIM})")
+    create_collection(client, target)
+
+    started = time.perf_counter()
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+        )
+        if points:
+            client.upsert(
+                collection_name=target,
+                points=[
+                    PointStruct(id=p.id, vector=point_vectors(dense_vector(p.vector), encode_document(p.payload or {})), payload=p.payload)
+                    for p in points
+                ],
+            )
+            copied += len(points)
+            print(f"Copied {copied} points...")
+        if offset is None:
+            break
+
+    expected = client.count(collection_name=source, exact=True).count
+    target_count = client.count(collection_name=target, exact=True).count
+    if target_count != expected:
+        raise RuntimeError(f"Copy incomplete ({target_count}/{expected}), leaving {source} in place; drop {target} and retry")
+
+    if is_alias:
+        # Atomic switch: readers see either the old or the new collection, never neither
+        client.update_collection_aliases(change_aliases_operations=[
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=COLLECTION_NAME)),
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=COLLECTION_NAME)),
+        ])
+        if not keep_old:
+            client.delete_collection(collection_name=source)
+    else:
+        # First migration: the real collection has to go before its name can become an alias
+        client.delete_collection(collection_name=source)
+        client.update_collection_aliases(change_aliases_operations=[
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=COLLECTION_NAME)),
+        ])
+    print(f"Migrated {copied} points in {time.perf_counter() - started:.1f}s; {COLLECTION_NAME} -> {target}")
+    print("Restart the agent engine and the GraphQL backend so they pick up the new layout")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the events collection into the configured layout without re-embedding.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--keep-old", action="store_true", help="keep the previous physical collection after switching an existing alias")
+    args = parser.parse_args()
+    migrate(batch_size=args.batch_size, keep_old=args.keep_old)
@@ -0,0 +1,24 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """Thread-safe token bucket. acquire() reserves a token and sleeps only as long as
+    needed, so requests go out at the full allowed rate and nothing waits after cache hits."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
@@ -0,0 +1,52 @@
+import re
+import hashlib
+from collections import Counter
+from qdrant_client.models import SparseVector
+
+# Locally computed BM25 term weights. Documents carry the saturated term frequency; the IDF part is
+# applied by Qdrant at query time (the sparse vector is created with Modifier.IDF), so nothing here
+# needs corpus statistics and no remote call is ever made.
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LEN = 60  # rough token count of a dossier's name + venue + vibe + summary
+
+STOPWORDS = {
+    "a", "an", "and", "at", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the", "to", "with",
+    "der", "die", "das", "und", "im", "am", "mit", "von", "zu", "ein", "eine",
+}
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+def token_id(token: str) -> int:
+    # Stable across processes (unlike hash()), so ingestion and query agree on indices
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big")
+
+def sparse_text(dossier: dict) -> str:
+    # Name and venue are repeated so exact-name matches outweigh words that only appear in a summary
+    name = dossier.get("eventName") or ""
+    venue = dossier.get("venueName") or ""
+    vibe = " ".join(dossier.get("vibeProfile") or [])
+    return f"{name} {name} {venue} {venue} {vibe} {dossier.get('summary') or ''}"
+
+def _to_sparse(weights: dict) -> SparseVector:
+    # Different tokens can collide on the same 32-bit id; their weights are summed
+    merged = {}
+    for token, weight in weights.items():
+        idx = token_id(token)
+        merged[idx] = merged.get(idx, 0.0) + weight
+    return SparseVector(indices=list(merged), values=list(merged.values()))
+
+def encode_document(dossier: dict) -> SparseVector:
+    tokens = tokenize(sparse_text(dossier))
+    doc_len_norm = 1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LEN
+    return _to_sparse({
+        token: tf * (BM25_K1 + 1) / (tf + BM25_K1 * doc_len_norm)
+        for token, tf in Counter(tokens).items()
+    })
+
+def encode_query(text: str) -> SparseVector:
+    return _to_sparse({token: 1.0 for token in set(tokenize(text))})
@@ -1,8 +1,20 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from litellm import embedding
+from qdrant_client.models import (
+    PointStruct, PointVectors, SetPayload, SetPayloadOperation, UpdateVectors, UpdateVectorsOperation,
+)
+from litellm import aembedding
 import uuid
 import asyncio
+import hashlib
+import json
+import os
+import re
+
+from embedding_cache import embedding_cache
+from geocoder import get_coords
+from collection_config import create_collection, create_payload_indexes, has_sparse_vectors, point_vectors, SPARSE_VECTOR_NAME
+from sparse_encoder import encode_document
+from metrics import span
 
 
 # Connecting to the Qdrant we added to docker-compose
@@ -12,102 +24,177 @@ QDRANT_URL = "http://localhost:6333"
 
 client = QdrantClient(url=QDRANT_URL)
 
+# Fixed namespace so the same event always maps to the same point ID
+EVENT_ID_NAMESPACE = uuid.UUID("5b0f3c4e-8d2a-4f7e-9c1b-b3e1a7d4c2f0")
+FINGERPRINT_FIELDS = ("content_hash", "payload_hash")
+# Attach lat/lng while vaulting instead of waiting for a separate geofix pass
+INLINE_GEOCODING = os.getenv("INLINE_GEOCODING", "true").lower() == "true"
+
 
 def init_db():
     """Creates the collection if it doesn't exist."""
     try:
         collections = client.get_collections().collections
-        exists = any(c.name == COLLECTION_NAME for c in collections)
+        aliases = client.get_aliases().aliases  # migrate_collection.py publishes the collection under an alias
+        exists = any(c.name == COLLECTION_NAME for c in collections) or any(a.alias_name == COLLECTION_NAME for a in aliases)
         
         if not exists:
             print(f"Creating collection: {COLLECTION_NAME}")
-            client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(size=3072, distance=Distance.COSINE),
-            )
+            create_collection(client, COLLECTION_NAME)
+        else:
+            # Collections created before the filter indexes existed get them here
+            create_payload_indexes(client, COLLECTION_NAME)
     except Exception as e:
         print(f"Database init failed: {e}")
 
+_sparse_enabled = None
+
+def sparse_enabled() -> bool:
+    """Whether the collection stores BM25 vectors (checked once; restart after migrate_collection.py)."""
+    global _sparse_enabled
+    if _sparse_enabled is None:
+        _sparse_enabled = has_sparse_vectors(client.get_collection(COLLECTION_NAME))
+    return _sparse_enabled
+
+def sparse_vector_for(dossier: dict):
+    return encode_document(dossier) if sparse_enabled() else None
+
+def _normalize(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+def event_key(dossier: dict) -> str:
+    """Stable identity of an event: normalized name, venue and date.
+    Rows without an explicit date fall back to their monthly collection (e.g. 'FebruaryEvents').
+    Agent dossiers carry neither, so they are keyed on name and venue alone and don't share
+    point IDs with the Baserow rows of the same event."""
+    when = dossier.get("date") or dossier.get("collection") or dossier.get("Collection")
+    return "|".join(_normalize(v) for v in (dossier.get("eventName"), dossier.get("venueName"), when))
+
+def event_point_id(dossier: dict) -> str:
+    return str(uuid.uuid5(EVENT_ID_NAMESPACE, event_key(dossier)))
+
+def is_placeholder(vector) -> bool:
+    """The all-zero vector the embedding helpers return when the API call failed."""
+    return not any(vector)
+
+def fingerprint(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+def with_fingerprints(dossier: dict, searchable_text: str) -> dict:
+    """Returns the payload to store: the dossier plus hashes of its embedding text and of its other fields."""
+    payload = {k: v for k, v in dossier.items() if k not in FINGERPRINT_FIELDS}
+    payload_hash = fingerprint(payload)
+    payload["content_hash"] = fingerprint(searchable_text)
+    payload["payload_hash"] = payload_hash
+    return payload
+
+def plan_writes(entries: list[tuple[str, dict]], full: bool = False):
+    """Splits (point_id, fingerprinted payload) entries against what is already stored.
+    Returns (to_embed, to_patch, unchanged): new or re-worded events need an embedding + upsert,
+    events whose only change is in the payload get a cheap set_payload."""
+    if full:
+        return list(entries), [], []
+
+    stored = {
+        str(p.id): p.payload or {}
+        for p in client.retrieve(
+            collection_name=COLLECTION_NAME,
+            ids=list({point_id for point_id, _ in entries}),
+            with_payload=list(FINGERPRINT_FIELDS),
+            with_vectors=False,
+        )
+    }
+    to_embed, to_patch, unchanged = [], [], []
+    for point_id, payload in entries:
+        old = stored.get(point_id)
+        if old is None or old.get("content_hash") != payload["content_hash"]:
+            to_embed.append((point_id, payload))
+        elif old.get("payload_hash") != payload["payload_hash"]:
+            to_patch.append((point_id, payload))
+        else:
+            unchanged.append((point_id, payload))
+    return to_embed, to_patch, unchanged
+
+def patch_payloads(entries: list[tuple[str, dict]]):
+    """Writes payload-only changes in a single batched request, leaving the dense vectors untouched.
+    The locally computed BM25 vector is refreshed too, since it also covers fields like vibeProfile."""
+    if not entries:
+        return
+    operations = [
+        SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+        for point_id, payload in entries
+    ]
+    if sparse_enabled():
+        operations.append(UpdateVectorsOperation(update_vectors=UpdateVectors(points=[
+            PointVectors(id=point_id, vector={SPARSE_VECTOR_NAME: encode_document(payload)})
+            for point_id, payload in entries
+        ])))
+    client.batch_update_points(collection_name=COLLECTION_NAME, update_operations=operations)
+
+def vault_text(dossier: dict) -> str:
+    """The text a vaulted dossier is embedded from."""
+    return f"{dossier.get('eventName')} at {dossier.get('venueName')}. {dossier.get('summary')}"
+
 async def save_to_vault(dossier: dict):
-    """Saves a single processed dossier from the Agent to Qdrant."""
+    """Saves a single processed dossier from the Agent to Qdrant.
+    The point ID is derived from the event itself, so re-ingesting an event updates it in place."""
     try:
         # Create searchable text from the agent's output
-        searchable_text = f"{dossier.get('eventName')} at {dossier.get('venueName')}. {dossier.get('summary')}"
-        
+        searchable_text = vault_text(dossier)
+        if INLINE_GEOCODING and dossier.get("lat") is None:
+            # Unplaced venues stay without coordinates, so geofix.py retries them later
+            coords = await asyncio.to_thread(get_coords, dossier.get("venueName"), dossier.get("district"))
+            if coords is not None:
+                dossier["lat"], dossier["lng"] = coords
+                dossier["location"] = {"lat": dossier["lat"], "lon": dossier["lng"]}
+        point_id = event_point_id(dossier)
+        payload = with_fingerprints(dossier, searchable_text)
+
+        to_embed, to_patch, _ = await asyncio.to_thread(plan_writes, [(point_id, payload)])
+        if to_patch:
+            await asyncio.to_thread(patch_payloads, to_patch)
+            print(f"Vaulted (payload only): {dossier.get('eventName')}")
+            return
+        if not to_embed:
+            print(f"Unchanged, skipped: {dossier.get('eventName')}")
+            return
+
         # Get embedding
         vector = await get_embedding(searchable_text)
-        
-        # Upsert
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vector,
-                    payload=dossier
-                )
-            ]
-        )
+        if is_placeholder(vector):
+            # Without a point (and its content_hash) the event is embedded again when it is next ingested
+            print(f"Not vaulted, embedding failed: {dossier.get('eventName')}")
+            return
+
+        # Upsert (off the event loop, the client is synchronous)
+        sparse = await asyncio.to_thread(sparse_vector_for, payload)
+        with span("qdrant"):
+            await asyncio.to_thread(
+                client.upsert,
+                collection_name=COLLECTION_NAME,
+                points=[PointStruct(id=point_id, vector=point_vectors(vector, sparse), payload=payload)]
+            )
         print(f"Vaulted: {dossier.get('eventName')}")
     except Exception as e:
         print(f"Failed to vault {dossier.get('eventName')}: {e}")
 
+EMBEDDING_MODEL = "gemini/text-embedding-004"
+
 async def get_embedding(text: str):
+    cached = await asyncio.to_thread(embedding_cache.get, EMBEDDING_MODEL, text)
+    if cached is not None:
+        return cached
     try:
-        response = embedding(
-            model="gemini/text-embedding-004", 
-            input=[text]
-        )
-        return response.data[0].embedding
+        with span("embedding"):
+            response = await aembedding(
+                model=EMBEDDING_MODEL, 
+                input=[text]
+            )
+        vector = response.data[0].embedding
+        await asyncio.to_thread(embedding_cache.put, EMBEDDING_MODEL, text, vector)
+        return vector
     except Exception as e:
         print(f"Embedding failed for text: {text[:30]}... Error: {e}")
         return [0.0] * 3072
-
-def get_baserow_rows():
-    url = f"https://api.baserow.io/api/database/rows/table/{BASEROW_TABLE_ID}/?user_field_names=true"
-    headers = {"Authorization": f"Token {BASEROW_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    return response.json().get("results", [])
-
-async def sync():
-    print(f"Starting sync from Baserow Table {BASEROW_TABLE_ID}...")
-    rows = get_baserow_rows()
-    
-    for row in rows:
-        # 1. Map Baserow fields to our Qdrant Schema
-        q_score_raw = float(row.get("QualityScore", 0) or 0)
-        
-        dossier = {
-            "eventName": row.get("Event"),
-            "venueName": row.get("Venue"),
-            "district": row.get("District"),
-            "summary": row.get("Summary"),
-            "influenceScore": float(row.get("VibeScore", 0) or 0),
-            "confidenceScore": 10, # default
-            "vibeProfile": [v.strip() for v in row.get("VibeProfile", "").split(",")] if row.get("VibeProfile") else [],
-            "quality_score": 1.0 if q_score_raw == 0 else q_score_raw,
-            "quality_reason": row.get("AuditReason") or "Verified via local fallback.",
-            "quality_status": row.get("DeepEvalAuditStatus") or "verified"
-        }
-
-        # 2. Generating the searchable text block for the embedding
-        searchable_text = f"{dossier['eventName']} at {dossier['venueName']}. Vibe: {', '.join(dossier['vibeProfile'])}. {dossier['summary']}"
-        
-        # 3. Getting the real vector
-        vector = await get_embedding(searchable_text)
-
-        # 4. Upserting to Qdrant
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vector,
-                    payload=dossier
-                )
-            ]
-        )
-        print(f"Synced: {dossier['eventName']}")
-
-if __name__ == "__main__":
-    asyncio.run(sync())
\ No newline at end of file
@@ -0,0 +1,12 @@
+import asyncio
+
+from job_queue import job_queue, JOB_WORKERS
+from main import run_job
+
+# Standalone ingestion workers: run the API with JOB_WORKERS=0 and start as many of these as needed.
+# They share the job database with the API, so they must run on the same host (or volume).
+# e.g. JOB_WORKERS=8 python worker.py
+
+if __name__ == "__main__":
+    print(f"Draining the ingestion queue with {JOB_WORKERS} workers...")
+    asyncio.run(job_queue.run_workers(run_job, max(1, JOB_WORKERS)))
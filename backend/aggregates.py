@@ -0,0 +1,180 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Deterministic answers for counting questions ("how many festival events in March?", "events per district"),
+# read from event_aggregates: a small cube of counts the archive sync rebuilds whenever historical_events changes.
+DIMENSIONS = ("district", "collection", "month", "quality_status")
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+
+CREATE_AGGREGATES_SQL = """
+    CREATE TABLE IF NOT EXISTS event_aggregates (
+        district TEXT, collection TEXT, month TEXT, quality_status TEXT, n INTEGER
+    )
+"""
+REFRESH_AGGREGATES_SQL = [
+    "DELETE FROM event_aggregates",
+    "INSERT INTO event_aggregates SELECT district, collection, month, quality_status, COUNT(*) "
+    "FROM historical_events GROUP BY district, collection, month, quality_status",
+]
+# For the LLM-written fallback queries, which scan historical_events directly
+ARCHIVE_INDEX_SQL = [
+    f"CREATE INDEX IF NOT EXISTS idx_historical_events_{column} ON historical_events ({column})"
+    for column in DIMENSIONS
+]
+
+PLURALS = {"district": "districts", "collection": "collections", "month": "months", "quality_status": "quality statuses"}
+# Month breakdowns also count the FestivalEvents/ExhibitionEvents collections, which have no month
+NO_VALUE = {"month": "no month"}
+
+COUNT_TRIGGERS = ("how many", "count", "number of", "total", "breakdown", "average")
+DIMENSION_WORDS = {
+    "district": "district", "districts": "district", "neighborhood": "district", "neighborhoods": "district",
+    "neighbourhood": "district", "neighbourhoods": "district", "area": "district", "areas": "district",
+    "kiez": "district", "collection": "collection", "collections": "collection", "category": "collection",
+    "categories": "collection", "type": "collection", "types": "collection", "kind": "collection",
+    "kinds": "collection", "month": "month", "months": "month", "monthly": "month", "status": "quality_status",
+    "quality": "quality_status",
+}
+# Words that carry no constraint; anything else left over means the question asks for more than a count
+FILLER_WORDS = {
+    "how", "many", "count", "counts", "number", "numbers", "of", "total", "totals", "the", "a", "an", "in", "at", "on",
+    "for", "to", "event", "events", "are", "is", "there", "were", "was", "be", "do", "does", "did", "we", "you", "i",
+    "me", "us", "our", "your", "have", "has", "had", "show", "list", "give", "tell", "what", "which", "whats", "by",
+    "per", "each", "every", "across", "and", "or", "with", "from", "berlin", "all", "s", "average", "breakdown",
+    "most", "top", "highest", "happening", "listed", "registered", "archive", "database", "stored", "so", "far",
+    "currently", "please", "can", "could", "get", "overall", "split", "broken", "down", "them", "it", "those", "these",
+    "got", "marked", "as",
+}
+
+
+def fold(text: str) -> str:
+    """Lowercase, accents stripped, punctuation turned into single spaces."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+def normalize_question(question: str) -> str:
+    return fold(question)
+
+def month_of(collection: Optional[str]) -> Optional[str]:
+    """'MarchEvents' -> 'March'; collections that aren't months (FestivalEvents, ...) have none."""
+    for month in MONTHS:
+        if (collection or "").lower().startswith(month.lower()):
+            return month
+    return None
+
+
+@dataclass
+class AggregateQuery:
+    filters: dict = field(default_factory=dict)  # dimension -> list of values
+    group_by: Optional[str] = None
+    average: bool = False
+
+
+class Vocabulary:
+    """Phrases that name a value of each dimension, built from the values present in the archive."""
+
+    def __init__(self, rows: list[tuple]):
+        self.phrases = []  # (folded phrase, dimension, value), longest first
+        for district, collection, _, quality_status in rows:
+            if district and "berlin" not in fold(district):  # "Berlin (multiple districts)" is no filter
+                self.phrases.append((fold(district), "district", district))
+            if collection and month_of(collection) is None:
+                stem = fold(re.sub(r"Events?$", "", collection))
+                for phrase in {fold(collection), stem, stem + "s"}:
+                    self.phrases.append((phrase, "collection", collection))
+            if quality_status:
+                self.phrases.append((fold(quality_status), "quality_status", quality_status))
+        for month in MONTHS:
+            self.phrases.append((month.lower(), "month", month))
+        self.phrases = sorted(set(p for p in self.phrases if p[0]), key=lambda p: -len(p[0]))
+
+
+def parse_question(question: str, vocabulary: Vocabulary) -> Optional[AggregateQuery]:
+    """Parses a counting question into filters and an optional breakdown dimension.
+    Returns None when the question asks for anything the aggregates can't answer exactly."""
+    text = f" {fold(question)} "
+    if not any(f" {trigger} " in text for trigger in COUNT_TRIGGERS) and " per " not in text:
+        return None
+
+    query = AggregateQuery(average=" average " in text)
+    for phrase, dimension, value in vocabulary.phrases:
+        if f" {phrase} " in text:
+            values = query.filters.setdefault(dimension, [])
+            if value not in values:
+                values.append(value)
+            text = text.replace(f" {phrase} ", " ")
+
+    leftover = []
+    for word in text.split():
+        dimension = DIMENSION_WORDS.get(word)
+        if dimension is None:
+            leftover.append(word)
+        elif dimension not in query.filters and query.group_by in (None, dimension):
+            query.group_by = dimension
+        elif dimension not in query.filters:
+            return None  # two breakdowns at once
+    if any(word not in FILLER_WORDS for word in leftover):
+        return None
+    if query.average and query.group_by is None:
+        return None
+    if "month" in query.filters and "collection" in query.filters:
+        # Only the monthly collections have a month: "festival events in March" would count 0.
+        # Festivals and exhibitions carry their dates in the text, so this goes to the SQL fallback
+        return None
+    return query
+
+def aggregate_sql(query: AggregateQuery) -> tuple[str, dict]:
+    where, params = [], {}
+    for dimension, values in query.filters.items():
+        names = [f"{dimension}_{i}" for i in range(len(values))]
+        where.append(f"{dimension} IN ({', '.join(':' + n for n in names)})")
+        params.update(zip(names, values))
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+    if query.group_by is None:
+        return f"SELECT COALESCE(SUM(n), 0) FROM event_aggregates{clause}", params
+    return (f"SELECT {query.group_by}, SUM(n) FROM event_aggregates{clause} "
+            f"GROUP BY {query.group_by} ORDER BY SUM(n) DESC, {query.group_by}"), params
+
+def describe_filters(filters: dict) -> str:
+    parts = []
+    for dimension, template in (("collection", "from the {} collection"), ("district", "in {}"),
+                                ("month", "in {}"), ("quality_status", "marked {}")):
+        if dimension in filters:
+            parts.append(template.format(" or ".join(filters[dimension])))
+    return (" " + " ".join(parts)) if parts else " in the archive"
+
+def format_answer(query: AggregateQuery, rows: list[tuple]) -> str:
+    where = describe_filters(query.filters)
+    if query.group_by is None:
+        total = rows[0][0] if rows else 0
+        return f"There {'is' if total == 1 else 'are'} {total} event{'' if total == 1 else 's'}{where}."
+
+    label = query.group_by.replace("_", " ")
+    groups = [(value or NO_VALUE.get(query.group_by, "unknown"), count) for value, count in rows]
+    total = sum(count for _, count in groups)
+    if not groups:
+        return f"There are no events{where}."
+    if query.average:
+        return (f"On average there are {total / len(groups):.1f} events per {label}{where} "
+                f"({total} events across {len(groups)} {PLURALS[query.group_by]}).")
+    shown = ", ".join(f"{value}: {count}" for value, count in groups[:10])
+    more = f", and {len(groups) - 10} more" if len(groups) > 10 else ""
+    return f"{total} events{where} by {label}: {shown}{more}."
+
+
+READ_ONLY_START = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# A keyword directly followed by "(" is a function call, e.g. replace(venueName, ...), not a statement
+WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|replace|drop|alter|create|attach|detach|pragma|vacuum|reindex|analyze)\b(?!\s*\()",
+    re.IGNORECASE,
+)
+# String literals and quoted identifiers ("update", `drop`, [delete]) can't hold statements
+QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`(?:[^`]|``)*`|\[[^\]]*\]")
+
+def is_read_only(sql: str) -> bool:
+    """A single SELECT (or WITH ... SELECT) without write keywords outside literals and quoted names."""
+    statement = QUOTED.sub("''", sql).strip().rstrip(";")
+    return bool(READ_ONLY_START.match(statement)) and ";" not in statement and not WRITE_KEYWORDS.search(statement)
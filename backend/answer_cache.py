@@ -0,0 +1,136 @@
+import os
+import time
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "900"))
+# Cosine similarity above which two questions are treated as the same question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+class SemanticAnswerCache:
+    """In-process cache of ask_agent answers keyed by question embedding.
+
+    A lookup hits when a cached question is within the similarity threshold, hasn't expired and was
+    answered from the same evidence (`signature`: the matched points and their content hashes, or the
+    SQL archive for analytical answers). Analytical answers are stored under an exact `key` (the
+    normalized question) instead: "how many events in Mitte" and "... in Neukölln" embed almost
+    identically, so they must not share an answer. Keyed lookups don't need the embedding at all.
+    The least recently used entry is evicted once the cache is full."""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._vectors = None  # (n, dim) matrix of unit vectors, row i belongs to self._entries[i]
+        self._entries = []    # dicts: signature, answer, created, last_used
+        self._keyed = {}      # key -> dict like the ones in self._entries
+        self.hits = self.misses = self.stale = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _drop(self, indices):
+        if not len(indices):
+            return
+        keep = np.setdiff1d(np.arange(len(self._entries)), indices)
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if len(keep) else None
+
+    def _expire(self, now: float):
+        self._drop([i for i, e in enumerate(self._entries) if now - e["created"] > self.ttl])
+        for key in [k for k, e in self._keyed.items() if now - e["created"] > self.ttl]:
+            del self._keyed[key]
+
+    def _hit(self, entry, signature, now: float):
+        if entry["signature"] != signature:
+            # Same question, but the matching events changed since it was answered
+            self.stale += 1
+            return None
+        entry["last_used"] = now
+        self.hits += 1
+        return entry["answer"]
+
+    def get(self, vector, signature, key=None):
+        """vector may be None for a keyed lookup."""
+        now = time.time()
+        self._expire(now)
+        if key is not None:
+            entry = self._keyed.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            answer = self._hit(entry, signature, now)
+            if answer is None:
+                del self._keyed[key]
+            return answer
+
+        if self._vectors is None or self._vectors.shape[1] != len(vector):
+            self.misses += 1
+            return None
+        similarities = self._vectors @ self._unit(vector)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        answer = self._hit(self._entries[best], signature, now)
+        if answer is None:
+            self._drop([best])
+        return answer
+
+    def _evict_lru(self):
+        entries = [("vector", i, e["last_used"]) for i, e in enumerate(self._entries)]
+        entries += [("key", k, e["last_used"]) for k, e in self._keyed.items()]
+        kind, which, _ = min(entries, key=lambda entry: entry[2])
+        if kind == "key":
+            del self._keyed[which]
+        else:
+            self._drop([which])
+        self.evictions += 1
+
+    def put(self, vector, signature, answer: str, key=None):
+        """vector may be None for a keyed entry."""
+        self._keyed.pop(key, None)
+        if len(self._entries) + len(self._keyed) >= self.max_entries:
+            self._evict_lru()
+        now = time.time()
+        entry = {"signature": signature, "answer": answer, "created": now, "last_used": now}
+        if key is not None:
+            self._keyed[key] = entry
+            return
+        unit = self._unit(vector)[None, :]
+        if self._vectors is not None and self._vectors.shape[1] != unit.shape[1]:
+            self._entries = []
+            self._vectors = None
+        self._entries.append(entry)
+        self._vectors = unit if self._vectors is None else np.vstack([self._vectors, unit])
+
+    def clear(self):
+        self._entries = []
+        self._vectors = None
+        self._keyed = {}
+
+    def invalidate(self):
+        """Called when the collection changed underneath the cached answers."""
+        if self._entries or self._keyed:
+            self.invalidations += 1
+        self.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "entries": len(self._entries) + len(self._keyed),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -1,52 +1,118 @@
-from geopy.geocoders import Nominatim
 from qdrant_client import QdrantClient
-import time
+from qdrant_client.models import (
+    DeletePayload, DeletePayloadOperation, FieldCondition, Filter, IsEmptyCondition, PayloadField, Range, SetPayload,
+    SetPayloadOperation,
+)
+import argparse
+import json
+import os
+import sys
+
+# The geocoder (persistent cache + Nominatim rate limiter) is shared with the ingestion pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents_python"))
+from geocoder import get_coords, location_key
 
 client = QdrantClient("http://localhost:6333")
-geolocator = Nominatim(user_agent="berlin_event_agent")
-
-# Coordinates for "Various venues" fallback
-BERLIN_CENTER = {"lat": 52.5200, "lng": 13.4050} # Berlin Center
-
-def get_coords(venue, district):
-    if "various" in venue.lower() or not venue:
-        print(f"Various venues detected for {district}, using center fallback.")
-        return BERLIN_CENTER["lat"], BERLIN_CENTER["lng"]
-    
-    try:
-        query = f"{venue}, {district}, Berlin, Germany"
-        location = geolocator.geocode(query)
-        if location:
-            return location.latitude, location.longitude
-        return BERLIN_CENTER["lat"], BERLIN_CENTER["lng"]
-    except Exception as e:
-        print(f"Geocoding error: {e}")
-        return BERLIN_CENTER["lat"], BERLIN_CENTER["lng"]
-
-def update_qdrant_with_coords():
-    # 1. Fetching all points
-    scroll_result = client.scroll(collection_name="berlin_events", limit=100, with_payload=True)
-    points = scroll_result[0]
-
-    for point in points:
-        payload = point.payload
-        venue = payload.get("venueName", "")
-        district = payload.get("district", "Berlin")
-        
-        lat, lng = get_coords(venue, district)
-        
-        # 2. Updating payload with new fields
-        payload["lat"] = lat
-        payload["lng"] = lng
-        
-        # 3. Overwriting in Qdrant
-        client.overwrite_payload(
-            collection_name="berlin_events",
-            payload=payload,
-            points=[point.id]
+
+COLLECTION_NAME = "berlin_events"
+SCROLL_PAGE_SIZE = 256
+# What the geocoder used to write for venues it couldn't place; points pinned there are geocoded again
+LEGACY_FALLBACK = (52.5200, 13.4050)
+# Progress is saved here after every page so an interrupted run picks up where it stopped
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geofix_checkpoint.json")
+
+def load_checkpoint() -> dict:
+    if os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    return {"offset": None, "updated": 0}
+
+def save_checkpoint(checkpoint: dict):
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def update_qdrant_with_coords(restart: bool = False):
+    """Pages through the collection, geocodes each unique (venue, district) once and writes
+    coordinates back with batched set_payload calls. Points that already have coordinates are skipped;
+    points with lat/lng but no geo `location` (written before the geo index existed) just get it filled in.
+    Venues that still can't be placed are left without coordinates (and lose any old fallback pin)."""
+    checkpoint = {"offset": None, "updated": 0} if restart else load_checkpoint()
+    if checkpoint["offset"] is not None:
+        print(f"Resuming from checkpoint ({checkpoint['updated']} points already updated)")
+
+    # Only points without coordinates (or with the old fallback pin) are scrolled at all
+    missing_coords = Filter(should=[
+        IsEmptyCondition(is_empty=PayloadField(key="location")),
+        Filter(must=[
+            FieldCondition(key="lat", range=Range(gte=LEGACY_FALLBACK[0], lte=LEGACY_FALLBACK[0])),
+            FieldCondition(key="lng", range=Range(gte=LEGACY_FALLBACK[1], lte=LEGACY_FALLBACK[1])),
+        ]),
+    ])
+    offset = checkpoint["offset"]
+
+    while True:
+        # 1. Fetching the next page of points that still need coordinates
+        points, next_offset = client.scroll(
+            collection_name=COLLECTION_NAME, scroll_filter=missing_coords, limit=SCROLL_PAGE_SIZE,
+            offset=offset, with_payload=["venueName", "district", "eventName", "lat", "lng"], with_vectors=False
         )
-        print(f"Updated {payload['eventName']} at {lat}, {lng}")
-        time.sleep(1)
+
+        # 2. Grouping points that share a venue and district (or already-known coordinates)
+        groups = {}
+        coords = {}
+        for point in points:
+            payload = point.payload or {}
+            venue = payload.get("venueName") or ""
+            district = payload.get("district") or "Berlin"
+            known = (payload.get("lat"), payload.get("lng"))
+            if None not in known and known != LEGACY_FALLBACK:
+                key = f"known|{payload['lat']}|{payload['lng']}"
+                coords[key] = (payload["lat"], payload["lng"])
+            else:
+                key = location_key(venue, district)
+            groups.setdefault(key, (venue, district, []))[2].append(point.id)
+
+        # 3. Geocoding each unique location once (repeats across pages and runs come from the geocode cache)
+        for key, (venue, district, _) in groups.items():
+            if key not in coords:
+                coords[key] = get_coords(venue, district)
+
+        # 4. Writing all coordinates of the page in one batched request
+        placed = {key: group for key, group in groups.items() if coords[key] is not None}
+        unplaced = [point_id for key, (_, _, point_ids) in groups.items() if coords[key] is None for point_id in point_ids]
+        operations = [
+            SetPayloadOperation(set_payload=SetPayload(
+                payload={
+                    "lat": coords[key][0], "lng": coords[key][1],
+                    "location": {"lat": coords[key][0], "lon": coords[key][1]}
+                },
+                points=point_ids
+            ))
+            for key, (_, _, point_ids) in placed.items()
+        ]
+        if unplaced:
+            operations.append(DeletePayloadOperation(delete_payload=DeletePayload(
+                keys=["lat", "lng", "location"], points=unplaced
+            )))
+        if operations:
+            client.batch_update_points(collection_name=COLLECTION_NAME, update_operations=operations)
+        checkpoint["updated"] += len(points) - len(unplaced)
+        checkpoint["offset"] = next_offset
+        save_checkpoint(checkpoint)
+        print(f"Updated {len(points) - len(unplaced)} points across {len(placed)} locations, {len(unplaced)} left unplaced "
+              f"({checkpoint['updated']} total)")
+
+        if next_offset is None:
+            break
+        offset = next_offset
+
+    os.remove(CHECKPOINT_PATH)
+    print(f"Geofix complete: {checkpoint['updated']} points updated")
 
 if __name__ == "__main__":
-    update_qdrant_with_coords()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Attach lat/lng to Qdrant events that don't have coordinates yet.")
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint and start from the beginning")
+    args = parser.parse_args()
+    update_qdrant_with_coords(restart=args.restart)
@@ -0,0 +1,214 @@
+import os
+import time
+import asyncio
+from collections import deque
+import litellm
+
+from metrics import Histogram, registry
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+# Fire a second provider when the first hasn't answered within its p95 latency
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))  # until enough samples exist
+LLM_MAX_PARALLEL = int(os.getenv("LLM_MAX_PARALLEL", "2"))
+# Circuit breaker: a 429 (or repeated failures) parks a provider; repeated trips back off exponentially
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN_SECONDS", "30"))
+LLM_MAX_COOLDOWN_SECONDS = float(os.getenv("LLM_MAX_COOLDOWN_SECONDS", "600"))
+LLM_FAILURES_BEFORE_COOLDOWN = int(os.getenv("LLM_FAILURES_BEFORE_COOLDOWN", "3"))
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "100"))  # recent calls kept per provider
+MIN_SAMPLES = 5
+
+provider_seconds = registry.add(Histogram(
+    "llm_provider_duration_seconds", "Latency of single provider attempts (hedge losers excluded).", ("model", "outcome")
+))
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, litellm.RateLimitError) or "429" in str(error)
+
+def percentile(values, q: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+class ProviderStats:
+    def __init__(self, model: str, api_key: str, position: int):
+        self.model = model
+        self.api_key = api_key
+        self.position = position  # configured order, used as tie-breaker
+        self.window = deque(maxlen=LLM_STATS_WINDOW)  # (latency seconds, ok)
+        self.cooldown_until = 0.0
+        self.trips = 0
+        self.consecutive_failures = 0
+        self.attempts = self.successes = self.failures = self.rate_limited = self.hedges = self.wins = 0
+
+    def latencies(self):
+        return [latency for latency, ok in self.window if ok]
+
+    def error_rate(self) -> float:
+        return sum(1 for _, ok in self.window if not ok) / len(self.window) if self.window else 0.0
+
+    def expected_latency(self) -> float:
+        # Latency we expect to pay, inflated by the chance of having to fail over
+        p50 = percentile(self.latencies(), 0.5) or LLM_HEDGE_DEFAULT_DELAY
+        return p50 * (1 + 4 * self.error_rate())
+
+    def hedge_delay(self) -> float:
+        latencies = self.latencies()
+        p95 = percentile(latencies, 0.95) if len(latencies) >= MIN_SAMPLES else LLM_HEDGE_DEFAULT_DELAY
+        return min(max(p95, 0.25), LLM_TIMEOUT_SECONDS)
+
+    def in_cooldown(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def record(self, latency: float, ok: bool, rate_limited: bool = False):
+        self.window.append((latency, ok))
+        provider_seconds.observe(latency, model=self.model, outcome="ok" if ok else "error")
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.trips = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if rate_limited:
+            self.rate_limited += 1
+        if rate_limited or self.consecutive_failures >= LLM_FAILURES_BEFORE_COOLDOWN:
+            self.cooldown_until = time.time() + min(LLM_COOLDOWN_SECONDS * 2 ** self.trips, LLM_MAX_COOLDOWN_SECONDS)
+            self.trips += 1
+            self.consecutive_failures = 0
+
+    def snapshot(self, now: float) -> dict:
+        latencies = self.latencies()
+        return {
+            "model": self.model,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "hedges": self.hedges,
+            "hedge_wins": self.wins,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(1000 * percentile(latencies, 0.5), 1) if latencies else None,
+            "p95_ms": round(1000 * percentile(latencies, 0.95), 1) if latencies else None,
+            "cooldown_remaining_s": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class LLMRouter:
+    """Routes completions across providers by observed latency and error rate, skips providers
+    whose circuit breaker is open, and optionally hedges a slow call with the next-best provider.
+    Streamed completions use the same ranking and breaker, without hedging."""
+
+    def __init__(self, model_list: list[dict]):
+        self.providers = [
+            ProviderStats(cfg["model"], cfg["api_key"], i) for i, cfg in enumerate(model_list) if cfg["api_key"]
+        ]
+
+    def ranked(self) -> list[ProviderStats]:
+        now = time.time()
+        available = [p for p in self.providers if not p.in_cooldown(now)]
+        if not available and self.providers:
+            # Everything is cooling down: probe the provider that recovers first (half-open breaker)
+            available = [min(self.providers, key=lambda p: p.cooldown_until)]
+        return sorted(available, key=lambda p: (p.expected_latency(), p.position))
+
+    async def _call(self, provider: ProviderStats, messages: list[dict]) -> str:
+        provider.attempts += 1
+        started = time.perf_counter()
+        try:
+            response = await litellm.acompletion(
+                model=provider.model, messages=messages, api_key=provider.api_key, timeout=LLM_TIMEOUT_SECONDS
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race: neither a success nor an error, and the elapsed time is only a lower
+            # bound on its latency, so it stays out of the window the ranking and hedge delay come from
+            raise
+        except Exception as e:
+            provider.record(time.perf_counter() - started, ok=False, rate_limited=is_rate_limit(e))
+            raise
+        provider.record(time.perf_counter() - started, ok=True)
+        return response.choices[0].message.content
+
+    async def complete(self, messages: list[dict]) -> str:
+        queue = self.ranked()
+        pending = {}
+
+        def launch(hedge: bool = False):
+            provider = queue.pop(0)
+            if hedge:
+                provider.hedges += 1
+            pending[asyncio.create_task(self._call(provider, messages))] = provider
+
+        if queue:
+            launch()
+        try:
+            while pending:
+                can_hedge = LLM_HEDGING and queue and len(pending) < LLM_MAX_PARALLEL
+                delay = min(p.hedge_delay() for p in pending.values()) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedge=True)
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if pending:
+                            provider.wins += 1
+                        return task.result()
+                    print(f"Model {provider.model} failed. Moving to next...")
+                if not pending and queue:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        # If we reach here, every single provider failed
+        raise Exception("All LLM providers exhausted or rate-limited.")
+
+    async def stream(self, messages: list[dict]):
+        """Yields answer tokens as they arrive. Fails over to the next provider only until the first token;
+        after that an error propagates, since the caller has already shown part of the answer. Not hedged."""
+        for provider in self.ranked():
+            provider.attempts += 1
+            started = time.perf_counter()
+            streamed = False
+            try:
+                response = await litellm.acompletion(
+                    model=provider.model, messages=messages, api_key=provider.api_key,
+                    timeout=LLM_TIMEOUT_SECONDS, stream=True
+                )
+                async for chunk in response:
+                    token = chunk.choices[0].delta.content if chunk.choices else None
+                    if token:
+                        streamed = True
+                        yield token
+            except Exception as e:
+                provider.record(time.perf_counter() - started, ok=False, rate_limited=is_rate_limit(e))
+                if streamed:
+                    raise
+                print(f"Model {provider.model} failed. Moving to next...")
+                continue
+            provider.record(time.perf_counter() - started, ok=True)
+            return
+        raise Exception("All LLM providers exhausted or rate-limited.")
+
+    def stats(self) -> list[dict]:
+        now = time.time()
+        return [p.snapshot(now) for p in self.providers]
+
+    def metric_families(self) -> list[tuple]:
+        """Per-provider counters of the fallback chain, for the /metrics collector."""
+        stats = self.stats()
+        counters = [
+            ("attempts", "Calls started, including hedges and failovers."), ("successes", "Calls that answered."),
+            ("failures", "Calls that failed."), ("rate_limited", "Failures that were rate limits."),
+            ("hedges", "Hedged calls fired because another provider was slow."),
+            ("hedge_wins", "Calls that answered first while another provider was still running."),
+        ]
+        families = [
+            (f"llm_provider_{name}_total", "counter", help_text, [({"model": s["model"]}, s[name]) for s in stats])
+            for name, help_text in counters
+        ]
+        families.append(("llm_provider_cooldown_seconds", "gauge", "Seconds until the provider's circuit breaker closes.",
+                         [({"model": s["model"]}, s["cooldown_remaining_s"]) for s in stats]))
+        return families
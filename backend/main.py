@@ -1,24 +1,55 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import strawberry
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from strawberry.fastapi import GraphQLRouter
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    FieldCondition, Filter, Fusion, FusionQuery, GeoBoundingBox, GeoPoint, GeoRadius, MatchAny, MatchValue, Prefetch,
+)
 from google import genai
 from google.genai import types
 from typing import List, Optional
+from enum import Enum
 import traceback
 from sqlalchemy import create_engine, text
-import litellm
+from sqlalchemy.ext.asyncio import create_async_engine
+import asyncio
+import hashlib
+import json
 import os
+import sys
+import dataclasses
+import math
 from fastapi.middleware.cors import CORSMiddleware
+from sse_starlette.sse import EventSourceResponse
+
+# Shared helpers (embedding cache, collection layout) live next to the agent pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents_python"))
+from embedding_cache import embedding_cache
+from answer_cache import answer_cache
+from llm_router import LLMRouter
+from collection_config import prepare_vector, search_params, has_sparse_vectors, SPARSE_VECTOR_NAME
+from sparse_encoder import encode_query
+from viewport_index import ViewportIndex, stub_from_payload
+from metrics import instrument, registry, span
+from aggregates import (
+    ARCHIVE_INDEX_SQL, CREATE_AGGREGATES_SQL, REFRESH_AGGREGATES_SQL, Vocabulary, aggregate_sql, format_answer,
+    is_read_only, month_of, normalize_question, parse_question,
+)
 
 
-client_qdrant = QdrantClient(url="http://localhost:6333")
+# Async client so a slow request never holds a worker thread
+async_qdrant = AsyncQdrantClient(url="http://localhost:6333")
 COLLECTION_NAME = "berlin_events"
 
 # We keep the native Gemini client for embeddings
 client_gemini_embed = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+QUERY_EMBEDDING_MODEL = "gemini-embedding-001"
 
-# Model Fallback Chain
+# Model Fallback Chain (initial preference order; the router re-ranks by observed latency/errors)
 MODEL_LIST = [
     {"model": "gemini/gemini-2.0-flash-lite", "api_key": os.getenv("GOOGLE_API_KEY")},
     {"model": "groq/llama-3.3-70b-versatile", "api_key": os.getenv("GROQ_API_KEY")},
@@ -28,31 +59,152 @@ MODEL_LIST = [
 ]
 
 engine = create_engine("sqlite:///./berlin_history.db")
+async_engine = create_async_engine("sqlite+aiosqlite:///./berlin_history.db")
+# LLM-written SQL only ever runs on a read-only connection
+readonly_engine = create_async_engine("sqlite+aiosqlite:///file:berlin_history.db?mode=ro&uri=true")
 
-def sync_qdrant_to_sql():
-    print("Syncing Qdrant vault to SQL archive...")
-    points, _ = client_qdrant.scroll(collection_name=COLLECTION_NAME, limit=100, with_payload=True)
-    with engine.connect() as conn:
-        conn.execute(text("DROP TABLE IF EXISTS historical_events"))
-        conn.execute(text("""
-            CREATE TABLE historical_events (
-                id INTEGER PRIMARY KEY,
-                eventName TEXT, district TEXT, venueName TEXT, collection TEXT, url TEXT, quality_status TEXT
-            )
-        """))
-        for p in points:
-            pay = p.payload
-            conn.execute(text("""
-                INSERT INTO historical_events (eventName, district, venueName, collection, url, quality_status)
-                VALUES (:eventName, :district, :venueName, :collection, :url, :quality_status)
-            """), {
-                "eventName": pay.get("eventName"), "district": pay.get("district"),
-                "venueName": pay.get("venueName"), "collection": pay.get("Collection"),
-                "url": pay.get("URL"), "quality_status": pay.get("quality_status")
-            })
-        conn.commit()
-
-sync_qdrant_to_sql()
+# How often the SQL archive is reconciled with Qdrant after startup
+SQL_SYNC_INTERVAL_SECONDS = int(os.getenv("SQL_SYNC_INTERVAL_SECONDS", "300"))
+SCROLL_PAGE_SIZE = 256
+
+ARCHIVE_COLUMNS = (
+    "point_id", "eventName", "district", "venueName", "collection", "month", "url", "quality_status", "row_hash"
+)
+CREATE_ARCHIVE_SQL = """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY,
+        point_id TEXT UNIQUE,
+        eventName TEXT, district TEXT, venueName TEXT, collection TEXT, month TEXT, url TEXT, quality_status TEXT,
+        row_hash TEXT
+    )
+"""
+UPSERT_ARCHIVE_SQL = (
+    f"INSERT OR REPLACE INTO {{table}} ({', '.join(ARCHIVE_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in ARCHIVE_COLUMNS)})"
+)
+
+def point_to_archive_row(point) -> dict:
+    pay = point.payload or {}
+    row = {
+        "point_id": str(point.id),
+        "eventName": pay.get("eventName"), "district": pay.get("district"),
+        "venueName": pay.get("venueName"), "collection": pay.get("collection") or pay.get("Collection"),
+        "url": pay.get("url") or pay.get("URL"), "quality_status": pay.get("quality_status")
+    }
+    row["month"] = month_of(row["collection"])
+    row["row_hash"] = hashlib.md5(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+    return row
+
+async def scroll_all_points(with_payload=True):
+    """Pages through the whole collection using the scroll offset."""
+    offset = None
+    while True:
+        points, offset = await async_qdrant.scroll(
+            collection_name=COLLECTION_NAME, limit=SCROLL_PAGE_SIZE, offset=offset,
+            with_payload=with_payload, with_vectors=False
+        )
+        for point in points:
+            yield point
+        if offset is None:
+            break
+
+def rebuild_archive(rows: list[dict]):
+    """Bulk-loads a shadow table, then swaps it in atomically so readers never see a half-built archive."""
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS historical_events_shadow"))
+        conn.execute(text(CREATE_ARCHIVE_SQL.format(table="historical_events_shadow")))
+        if rows:
+            conn.execute(text(UPSERT_ARCHIVE_SQL.format(table="historical_events_shadow")), rows)
+
+    # pysqlite doesn't wrap DDL in a transaction on its own, so the swap runs as one explicit script
+    # (together with the new table's indexes and the aggregate counts)
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.executescript(f"""
+            BEGIN;
+            DROP TABLE IF EXISTS historical_events;
+            ALTER TABLE historical_events_shadow RENAME TO historical_events;
+            {"; ".join(ARCHIVE_INDEX_SQL)};
+            {CREATE_AGGREGATES_SQL};
+            {"; ".join(REFRESH_AGGREGATES_SQL)};
+            COMMIT;
+        """)
+    finally:
+        raw.close()
+
+def refresh_archive(rows: list[dict]):
+    """Writes only the rows whose content changed and deletes rows whose point is gone."""
+    with engine.begin() as conn:
+        stored = dict(conn.execute(text("SELECT point_id, row_hash FROM historical_events")).fetchall())
+        changed = [r for r in rows if stored.get(r["point_id"]) != r["row_hash"]]
+        gone = stored.keys() - {r["point_id"] for r in rows}
+        if changed:
+            conn.execute(text(UPSERT_ARCHIVE_SQL.format(table="historical_events")), changed)
+        if gone:
+            conn.execute(text("DELETE FROM historical_events WHERE point_id = :point_id"), [{"point_id": p} for p in gone])
+        if changed or gone:
+            conn.execute(text(CREATE_AGGREGATES_SQL))
+            for statement in REFRESH_AGGREGATES_SQL:
+                conn.execute(text(statement))
+    return len(changed), len(gone)
+
+async def sync_qdrant_to_sql(full: bool = True) -> dict:
+    """Mirrors the Qdrant collection into historical_events.
+    full=True rebuilds the table through a shadow swap; otherwise only changed rows are written."""
+    global viewport_index
+    timings = {}
+    started = time.perf_counter()
+    payload_fields = ["eventName", "district", "venueName", "collection", "Collection", "url", "URL", "quality_status",
+                      "lat", "lng", "vibeProfile"]
+    with span("archive_scroll"):
+        points = [p async for p in scroll_all_points(with_payload=payload_fields)]
+    rows = [point_to_archive_row(p) for p in points]
+    timings["qdrant_scroll"] = time.perf_counter() - started
+
+    # The map's viewport index: rebuilt off the event loop on a full sync, otherwise patched with the changes
+    started = time.perf_counter()
+    stubs = {}
+    for point in points:
+        stub = stub_from_payload(str(point.id), point.payload or {})
+        if stub is not None:
+            stubs[stub.id] = stub
+    if full:
+        viewport_index = await asyncio.to_thread(ViewportIndex.build, stubs)
+    else:
+        viewport_index.apply(*await asyncio.to_thread(viewport_index.diff, stubs))
+    timings["viewport_index"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with span("archive_write"):
+        if full:
+            await asyncio.to_thread(rebuild_archive, rows)
+            changed, gone = len(rows), 0
+        else:
+            changed, gone = await asyncio.to_thread(refresh_archive, rows)
+    timings["sql_write"] = time.perf_counter() - started
+    if changed or gone:
+        # The collection was written to since the last sync: cached answers may be outdated
+        global _vocabulary
+        answer_cache.invalidate()
+        _vocabulary = None
+
+    print(f"SQL archive {'rebuilt' if full else 'refreshed'}: {len(rows)} points, {changed} written, {gone} removed "
+          f"(scroll {timings['qdrant_scroll']:.2f}s, viewport index {timings['viewport_index']:.2f}s, "
+          f"write {timings['sql_write']:.2f}s)")
+    return timings
+
+viewport_index = ViewportIndex()  # filled by the first archive sync
+
+async def keep_archive_in_sync():
+    """Background task: full rebuild once Qdrant is reachable, then incremental refreshes on a schedule."""
+    synced_once = False
+    while True:
+        try:
+            await sync_qdrant_to_sql(full=not synced_once)
+            synced_once = True
+        except Exception as e:
+            print(f"SQL archive sync failed, retrying in {SQL_SYNC_INTERVAL_SECONDS}s: {e}")
+        await asyncio.sleep(SQL_SYNC_INTERVAL_SECONDS)
 
 # DATA MODELS
 @strawberry.type
@@ -68,6 +220,63 @@ class Event:
     url: Optional[str]
     collection: Optional[str]
 
+@strawberry.enum
+class SearchMode(Enum):
+    HYBRID = "hybrid"  # dense + BM25, fused with reciprocal rank fusion
+    DENSE = "dense"
+    SPARSE = "sparse"  # BM25 only: no remote embedding call, best for exact names
+
+@strawberry.input
+class GeoRadiusInput:
+    lat: float
+    lng: float
+    radiusMeters: float
+
+@strawberry.input
+class BoundingBoxInput:
+    south: float
+    west: float
+    north: float
+    east: float
+
+@strawberry.input
+class EventFilter:
+    district: Optional[str] = None
+    collection: Optional[str] = None
+    qualityStatus: Optional[str] = None
+    vibeTags: Optional[List[str]] = None  # matches events carrying any of the tags
+    near: Optional[GeoRadiusInput] = None
+    bbox: Optional[BoundingBoxInput] = None
+
+@strawberry.type
+class EventStub:
+    """Just enough to draw and label a pin; the full event comes from searchEvents."""
+    id: str
+    eventName: str
+    venueName: str
+    district: str
+    lat: float
+    lng: float
+    collection: Optional[str]
+    qualityStatus: str
+
+@strawberry.type
+class EventCluster:
+    lat: float  # mean position of the events in the cluster
+    lng: float
+    count: int
+    south: float  # grid cell the cluster covers: zoom the map to it to expand the cluster
+    west: float
+    north: float
+    east: float
+
+@strawberry.type
+class ViewportResult:
+    total: int
+    clusters: List[EventCluster]
+    events: List[EventStub]
+    truncated: bool  # more events in view than VIEWPORT_MAX_STUBS
+
 @strawberry.type
 class AgentResponse:
     answer: str
@@ -75,112 +284,408 @@ class AgentResponse:
 
 # HELPER FUNCTIONS
 
-def get_llm_completion(prompt: str, system_instruction: str = "You are a helpful assistant."):
-    """Tries models in order. If one fails, it logs and moves to the next."""
-    for model_cfg in MODEL_LIST:
-        if not model_cfg["api_key"]: continue
-        try:
-            response = litellm.completion(
-                model=model_cfg["model"],
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": prompt}
-                ],
-                api_key=model_cfg["api_key"],
-                timeout=10 # Not hanging the UI
+llm_router = LLMRouter(MODEL_LIST)
+
+def chat_messages(prompt: str, system_instruction: str) -> List[dict]:
+    return [
+        {"role": "system", "content": system_instruction},
+        {"role": "user", "content": prompt}
+    ]
+
+async def get_llm_completion(prompt: str, system_instruction: str = "You are a helpful assistant."):
+    """Routes to the fastest healthy provider, hedging and failing over as needed (see llm_router.py)."""
+    with span("llm"):
+        return await llm_router.complete(chat_messages(prompt, system_instruction))
+
+async def get_query_embedding(query_text: str) -> List[float]:
+    """Embeds a search query, serving repeated queries from the on-disk embedding cache."""
+    query_vector = await asyncio.to_thread(
+        embedding_cache.get, QUERY_EMBEDDING_MODEL, query_text, task_type="RETRIEVAL_QUERY"
+    )
+    if query_vector is None:
+        with span("embedding"):
+            embedding_result = await client_gemini_embed.aio.models.embed_content(
+                model=QUERY_EMBEDDING_MODEL,
+                contents=query_text,
+                config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
             )
-            return response.choices[0].message.content
+        query_vector = embedding_result.embeddings[0].values
+        await asyncio.to_thread(
+            embedding_cache.put, QUERY_EMBEDDING_MODEL, query_text, query_vector, task_type="RETRIEVAL_QUERY"
+        )
+    return query_vector
+
+def build_qdrant_filter(filters: Optional[EventFilter]) -> Optional[Filter]:
+    """Turns the GraphQL filter input into a Qdrant filter, evaluated against the payload indexes."""
+    if filters is None:
+        return None
+    must = []
+    for key, value in (("district", filters.district), ("collection", filters.collection),
+                       ("quality_status", filters.qualityStatus)):
+        if value:
+            must.append(FieldCondition(key=key, match=MatchValue(value=value)))
+    if filters.vibeTags:
+        must.append(FieldCondition(key="vibeProfile", match=MatchAny(any=filters.vibeTags)))
+    if filters.near:
+        must.append(FieldCondition(key="location", geo_radius=GeoRadius(
+            center=GeoPoint(lat=filters.near.lat, lon=filters.near.lng), radius=filters.near.radiusMeters
+        )))
+    if filters.bbox:
+        must.append(FieldCondition(key="location", geo_bounding_box=GeoBoundingBox(
+            top_left=GeoPoint(lat=filters.bbox.north, lon=filters.bbox.west),
+            bottom_right=GeoPoint(lat=filters.bbox.south, lon=filters.bbox.east)
+        )))
+    return Filter(must=must) if must else None
+
+# Candidates each retriever contributes before fusion
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", "20"))
+_collection_has_sparse = None
+
+async def collection_has_sparse() -> bool:
+    """Collections created before hybrid search have no BM25 vectors; they are searched dense-only."""
+    global _collection_has_sparse
+    if _collection_has_sparse is None:
+        with span("qdrant"):
+            _collection_has_sparse = has_sparse_vectors(await async_qdrant.get_collection(COLLECTION_NAME))
+    return _collection_has_sparse
+
+async def search_points(query_text: str, limit: int = 5, filters: Optional[EventFilter] = None,
+                        mode: SearchMode = SearchMode.HYBRID, query_vector: Optional[List[float]] = None):
+    """Runs the Qdrant query and returns the raw scored points (pass query_vector to reuse an embedding)."""
+    query_filter = build_qdrant_filter(filters)
+    use_sparse = mode != SearchMode.DENSE and await collection_has_sparse()
+
+    if query_vector is not None:
+        query_vector = prepare_vector(query_vector)
+    elif mode != SearchMode.SPARSE or not use_sparse:
+        try:
+            query_vector = prepare_vector(await get_query_embedding(query_text))
         except Exception as e:
-            print(f"Model {model_cfg['model']} failed. Moving to next...")
-            continue
-    # If we reach here, every single provider failed
-    raise Exception("All LLM providers exhausted or rate-limited.")
-
-def get_qdrant_matches(query_text: str, limit: int = 5) -> List[Event]:
-    embedding_result = client_gemini_embed.models.embed_content(
-        model="gemini-embedding-001",
-        contents=query_text,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
+            if not use_sparse:
+                raise
+            # Embedding provider down or rate-limited: BM25 still answers
+            print(f"Dense embedding unavailable, answering from BM25 only: {e}")
+
+    if use_sparse and query_vector is not None:
+        prefetch_limit = max(HYBRID_PREFETCH_LIMIT, limit)
+        request = dict(
+            prefetch=[
+                Prefetch(query=query_vector, filter=query_filter, limit=prefetch_limit, params=search_params()),
+                Prefetch(query=encode_query(query_text), using=SPARSE_VECTOR_NAME, filter=query_filter, limit=prefetch_limit),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF)
+        )
+    elif use_sparse:
+        request = dict(query=encode_query(query_text), using=SPARSE_VECTOR_NAME, query_filter=query_filter)
+    else:
+        request = dict(query=query_vector, query_filter=query_filter, search_params=search_params())
+    with span("qdrant"):
+        response = await async_qdrant.query_points(
+            collection_name=COLLECTION_NAME, limit=limit, with_payload=True, **request
+        )
+    return response.points
+
+def hit_to_event(pay: dict) -> Event:
+    # print(f"DEBUG: Qdrant Payload for {pay.get('eventName')}: {pay.keys()}")
+    return Event(
+        eventName=pay.get("eventName") or pay.get("EventName") or "Unknown Event",
+        venueName=pay.get("venueName") or pay.get("VenueName") or "",
+        district=pay.get("district") or pay.get("District") or "",
+        summary=pay.get("summary") or pay.get("Summary") or "",
+        lat=float(pay.get("lat", 0.0)),
+        lng=float(pay.get("lng", 0.0)),
+        vibeProfile=pay.get("vibeProfile", []),
+        qualityStatus=pay.get("quality_status", "unverified"),
+        url=pay.get("URL") or pay.get("url"),
+        collection=pay.get("Collection") or pay.get("collection")
+    )
+
+async def get_qdrant_matches(query_text: str, limit: int = 5, filters: Optional[EventFilter] = None,
+                             mode: SearchMode = SearchMode.HYBRID) -> List[Event]:
+    hits = await search_points(query_text, limit=limit, filters=filters, mode=mode)
+    return [hit_to_event(hit.payload or {}) for hit in hits]
+
+async def embed_question(question: str) -> Optional[List[float]]:
+    try:
+        return await get_query_embedding(question)
+    except Exception as e:
+        print(f"Embedding error: {e}")
+        return None
+
+async def get_hits_or_empty(query_text: str, limit: int, query_vector: Optional[List[float]]):
+    try:
+        # Without a question embedding only BM25 can still answer
+        mode = SearchMode.HYBRID if query_vector is not None else SearchMode.SPARSE
+        return await search_points(query_text, limit=limit, mode=mode, query_vector=query_vector)
+    except Exception as e:
+        print(f"Embedding error: {e}")
+        return []
+
+async def get_hits_when_embedded(query_text: str, limit: int, vector_task: asyncio.Task):
+    return await get_hits_or_empty(query_text, limit, await vector_task)
+
+def matches_signature(hits) -> tuple:
+    """Identifies the evidence an answer was built from: matched points and their content fingerprints."""
+    return tuple(
+        (str(hit.id), (hit.payload or {}).get("content_hash"), (hit.payload or {}).get("payload_hash"))
+        for hit in hits
     )
-    query_vector = embedding_result.embeddings[0].values
-    search_results = client_qdrant.query_points(
-        collection_name=COLLECTION_NAME, query=query_vector, limit=limit, with_payload=True
-    ).points
-
-    events = []
-    for hit in search_results:
-        pay = hit.payload
-        # print(f"DEBUG: Qdrant Payload for {pay.get('eventName')}: {pay.keys()}")
-
-        events.append(Event(
-            eventName=pay.get("eventName") or pay.get("EventName") or "Unknown Event",
-            venueName=pay.get("venueName") or pay.get("VenueName") or "",
-            district=pay.get("district") or pay.get("District") or "",
-            summary=pay.get("summary") or pay.get("Summary") or "",
-            lat=float(pay.get("lat", 0.0)),
-            lng=float(pay.get("lng", 0.0)),
-            vibeProfile=pay.get("vibeProfile", []),
-            qualityStatus=pay.get("quality_status", "unverified"),
-            url=pay.get("URL") or pay.get("url"),
-            collection=pay.get("Collection") or pay.get("collection")
-        ))
-    return events
+
+_vocabulary = None  # district/collection/status names in the archive, reloaded after each changing sync
+
+async def aggregate_answer(question: str) -> Optional[str]:
+    """FAST PATH: counts and breakdowns answered from event_aggregates, without an LLM. None when the
+    question isn't one the aggregates answer exactly (or the archive isn't built yet)."""
+    global _vocabulary
+    try:
+        with span("aggregates"):
+            async with async_engine.connect() as conn:
+                if _vocabulary is None:
+                    rows = (await conn.execute(text(
+                        "SELECT DISTINCT district, collection, month, quality_status FROM event_aggregates"
+                    ))).fetchall()
+                    _vocabulary = Vocabulary(rows)
+                query = parse_question(question, _vocabulary)
+                if query is None:
+                    return None
+                sql, params = aggregate_sql(query)
+                rows = (await conn.execute(text(sql), params)).fetchall()
+    except Exception as e:
+        print(f"Aggregates unavailable, using generated SQL: {e}")
+        return None
+    return format_answer(query, rows)
+
+CREATE_SQL_CACHE = "CREATE TABLE IF NOT EXISTS generated_sql (question TEXT PRIMARY KEY, sql TEXT, created_at REAL)"
+
+async def cached_sql(question_key: str) -> Optional[str]:
+    async with async_engine.begin() as conn:
+        await conn.execute(text(CREATE_SQL_CACHE))
+        row = (await conn.execute(
+            text("SELECT sql FROM generated_sql WHERE question = :question"), {"question": question_key}
+        )).fetchone()
+    return row[0] if row else None
+
+async def store_sql(question_key: str, sql_query: str):
+    async with async_engine.begin() as conn:
+        await conn.execute(text(CREATE_SQL_CACHE))
+        await conn.execute(text("INSERT OR REPLACE INTO generated_sql VALUES (:question, :sql, :created_at)"),
+                           {"question": question_key, "sql": sql_query, "created_at": time.time()})
+
+AGENT_OFFLINE_ANSWER = "Sorry, at this moment my analytical brain is offline (all LLMs rate-limited), but I've pulled these locations for you!"
+ANALYTICAL_TRIGGERS = ["how many", "count", "total", "average", "history", "number of", "breakdown"]
+
+def is_analytical(question: str) -> bool:
+    return any(t in question.lower() for t in ANALYTICAL_TRIGGERS)
+
+async def analytical_prompt(question: str) -> tuple[str, str]:
+    """SQL PATH: LLM-written SQLite over the historical archive; returns the (prompt, system) for the summary.
+    The query is cached per normalized question and only runs if it is a single read-only SELECT."""
+    schema_info = """
+    Table: historical_events
+    Columns: eventName, district, venueName, collection, month, url, quality_status
+    Note: The 'collection' column contains strings like 'FebruaryEvents' or 'MarchEvents', the type of event can be found here also, like 'FestivalEvents' or 'ExhibitionEvents'. 'month' is the month of month collections ('March'), otherwise NULL.
+    """
+    question_key = normalize_question(question)
+    sql_query = await cached_sql(question_key)
+    generated = sql_query is None
+    if generated:
+        sql_prompt = f"Given {schema_info}, write a SQLite query for: {question}. Output raw SQL only."
+        sql_query = await get_llm_completion(sql_prompt, "You are a SQL expert.")
+
+        # Clean the SQL
+        sql_query = sql_query.strip().replace("```sql", "").replace("```", "").strip()
+    if not is_read_only(sql_query):
+        raise ValueError(f"Generated SQL is not a read-only query: {sql_query[:100]}")
+
+    with span("sql"):
+        async with readonly_engine.connect() as conn:
+            db_res = (await conn.execute(text(sql_query))).fetchall()
+    if generated:
+        await store_sql(question_key, sql_query)
+    return f"User asked: {question}. Data: {str(db_res)}. Summarize shortly.", "You are a data assistant."
+
+def rag_prompt(question: str, matched_events: List[Event]) -> tuple[str, str]:
+    """RAG PATH: answer from the matched events."""
+    context = "\n".join([f"- {e.eventName}: {e.summary}" for e in matched_events])
+    return f"Context:\n{context}\n\nQuestion: {question}", "You are a witty Berlin guide."
+
+async def answer_analytical(question: str) -> str:
+    return await get_llm_completion(*await analytical_prompt(question))
+
+def viewport_filter(filters: Optional[EventFilter]) -> tuple:
+    """EventFilter as (facet, predicate) for the viewport index. A filter on just one of district, collection
+    or qualityStatus is a facet with precomputed counts; anything else becomes a predicate over the stubs."""
+    if filters is None:
+        return None, None
+    facets = [(name, value) for name, value in (("district", filters.district), ("collection", filters.collection),
+                                                ("qualityStatus", filters.qualityStatus)) if value]
+    if len(facets) == 1 and not (filters.vibeTags or filters.near or filters.bbox):
+        return facets[0], None
+    checks = []
+    if filters.district:
+        checks.append(lambda s: s.district == filters.district)
+    if filters.collection:
+        checks.append(lambda s: s.collection == filters.collection)
+    if filters.qualityStatus:
+        checks.append(lambda s: s.qualityStatus == filters.qualityStatus)
+    if filters.vibeTags:
+        tags = set(filters.vibeTags)
+        checks.append(lambda s: not tags.isdisjoint(s.vibeProfile))
+    if filters.near:
+        near = filters.near
+        checks.append(lambda s: distance_meters(near.lat, near.lng, s.lat, s.lng) <= near.radiusMeters)
+    if filters.bbox:
+        box = filters.bbox
+        checks.append(lambda s: box.south <= s.lat <= box.north and box.west <= s.lng <= box.east)
+    if not checks:
+        return None, None
+    return None, lambda stub: all(check(stub) for check in checks)
+
+def distance_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Haversine distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
 
 # GRAPHQL QUERY LOGIC
 
 @strawberry.type
 class Query:
     @strawberry.field
-    def search_events(self, query_text: str) -> List[Event]:
-        return get_qdrant_matches(query_text)
+    async def search_events(self, query_text: str, filters: Optional[EventFilter] = None, limit: int = 5,
+                            mode: SearchMode = SearchMode.HYBRID) -> List[Event]:
+        return await get_qdrant_matches(query_text, limit=limit, filters=filters, mode=mode)
 
     @strawberry.field
-    def ask_agent(self, question: str) -> AgentResponse:
-        # Step 1: Always trying to get matches first (Reliable Embedding Quota)
-        try:
-            matched_events = get_qdrant_matches(question, limit=3)
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            matched_events = []
+    def events_in_viewport(self, bbox: BoundingBoxInput, zoom: int, filters: Optional[EventFilter] = None) -> ViewportResult:
+        """Everything in the visible map area: clusters with counts, or event stubs from VIEWPORT_STUB_ZOOM on.
+        Served from the in-memory viewport index, which the archive sync keeps up to date."""
+        with span("viewport"):
+            facet, matches = viewport_filter(filters)
+            result = viewport_index.query(bbox.south, bbox.west, bbox.north, bbox.east, zoom, facet, matches)
+        return ViewportResult(
+            total=result["total"],
+            clusters=[EventCluster(**c) for c in result["clusters"]],
+            events=[EventStub(id=s.id, eventName=s.eventName, venueName=s.venueName, district=s.district, lat=s.lat,
+                              lng=s.lng, collection=s.collection, qualityStatus=s.qualityStatus)
+                    for s in result["events"]],
+            truncated=result["truncated"],
+        )
+
+    @strawberry.field
+    async def ask_agent(self, question: str) -> AgentResponse:
+        # Step 1: Embedding the question once, in the background; it keys the semantic answer cache and
+        # drives the match lookup. Counting questions and cached analytical answers never wait for it.
+        vector_task = asyncio.create_task(embed_question(question))
+        hits_task = asyncio.create_task(get_hits_when_embedded(question, 3, vector_task))
 
         # Step 2: Routing & Generation inside a Safety Exception Block
         try:
-            analytical_triggers = ["how many", "count", "total", "average", "history"]
-            is_analytical = any(t in question.lower() for t in analytical_triggers)
-
-            if is_analytical:
-                # SQL PATH
-                schema_info = """
-                Table: historical_events
-                Columns: eventName, district, venueName, collection, url, quality_status
-                Note: The 'collection' column contains strings like 'FebruaryEvents' or 'MarchEvents', the type of event can be found here also, like 'FestivalEvents' or 'ExhibitionEvents'.
-                """
-                sql_prompt = f"Given {schema_info}, write a SQLite query for: {question}. Output raw SQL only."
-                sql_query = get_llm_completion(sql_prompt, "You are a SQL expert.")
-                
-                # Clean the SQL
-                sql_query = sql_query.strip().replace("```sql", "").replace("```", "")
-                
-                with engine.connect() as conn:
-                    db_res = conn.execute(text(sql_query)).fetchall()
-                    summary_prompt = f"User asked: {question}. Data: {str(db_res)}. Summarize shortly."
-                    answer_text = get_llm_completion(summary_prompt, "You are a data assistant.")
-            else:
-                # RAG PATH
-                context = "\n".join([f"- {e.eventName}: {e.summary}" for e in matched_events])
-                prompt = f"Context:\n{context}\n\nQuestion: {question}"
-                answer_text = get_llm_completion(prompt, "You are a witty Berlin guide.")
+            analytical = is_analytical(question)
+            # Counting questions the aggregates answer exactly skip the cache and both LLM calls
+            answer_text = await aggregate_answer(question) if analytical else None
+
+            if answer_text is None and analytical:
+                # Analytical answers depend on the SQL archive, which clears the cache whenever it changes,
+                # and are only reused for the same normalized question. The SQL path doesn't need the matches,
+                # so it runs while the lookup is in flight
+                cache_key = normalize_question(question)
+                answer_text = answer_cache.get(None, ("sql",), cache_key)
+                if answer_text is None:
+                    answer_text = await answer_analytical(question)
+                    answer_cache.put(None, ("sql",), answer_text, cache_key)
+
+            elif answer_text is None:
+                hits = await hits_task
+                question_vector = await vector_task
+                signature = matches_signature(hits)
+                answer_text = answer_cache.get(question_vector, signature) if question_vector is not None else None
+                if answer_text is None:
+                    matched_events = [hit_to_event(hit.payload or {}) for hit in hits]
+                    answer_text = await get_llm_completion(*rag_prompt(question, matched_events))
+                    if question_vector is not None:
+                        answer_cache.put(question_vector, signature, answer_text)
 
         except Exception as e:
             print(f"CRITICAL AGENT ERROR: {traceback.format_exc()}")
-            answer_text = "Sorry, at this moment my analytical brain is offline (all LLMs rate-limited), but I've pulled these locations for you!"
+            answer_text = AGENT_OFFLINE_ANSWER
 
+        matched_events = [hit_to_event(hit.payload or {}) for hit in await hits_task]
         return AgentResponse(answer=answer_text, matches=matched_events)
 
+# STREAMING ASK_AGENT (server-sent events)
+
+def sse(event: str, data) -> dict:
+    # JSON keeps newlines and leading spaces in tokens intact across the SSE framing
+    return {"event": event, "data": json.dumps(data)}
+
+async def stream_agent_answer(question: str):
+    """Same routing and caching as ask_agent, but yields `matches` as soon as the vector search returns,
+    then the answer as `token` events and a final `done` ({"cached", "complete"})."""
+    vector_task = asyncio.create_task(embed_question(question))
+    hits_task = asyncio.create_task(get_hits_when_embedded(question, 3, vector_task))
+    analytical = is_analytical(question)
+    aggregate = await aggregate_answer(question) if analytical else None
+    cached = None
+    cache_key = normalize_question(question) if analytical else None
+    if analytical and aggregate is None:
+        cached = answer_cache.get(None, ("sql",), cache_key)
+    # The SQL step doesn't need the matches (or the embedding), so it starts before they are sent
+    needs_sql = analytical and aggregate is None and cached is None
+    prompt_task = asyncio.create_task(analytical_prompt(question)) if needs_sql else None
+    try:
+        hits = await hits_task
+        matched_events = [hit_to_event(hit.payload or {}) for hit in hits]
+        yield sse("matches", [dataclasses.asdict(e) for e in matched_events])
+        if aggregate is not None:
+            yield sse("token", aggregate)
+            yield sse("done", {"cached": False, "complete": True})
+            return
+
+        signature = ("sql",) if analytical else matches_signature(hits)
+        question_vector = await vector_task  # already done: the matches waited for it
+        if not analytical and question_vector is not None:
+            cached = answer_cache.get(question_vector, signature)
+        if cached is not None:
+            yield sse("token", cached)
+            yield sse("done", {"cached": True, "complete": True})
+            return
+
+        tokens = []
+        try:
+            prompt, system_instruction = await prompt_task if analytical else rag_prompt(question, matched_events)
+            with span("llm_stream"):
+                async for token in llm_router.stream(chat_messages(prompt, system_instruction)):
+                    tokens.append(token)
+                    yield sse("token", token)
+        except Exception:
+            print(f"CRITICAL AGENT ERROR: {traceback.format_exc()}")
+            if not tokens:
+                yield sse("token", AGENT_OFFLINE_ANSWER)
+            yield sse("done", {"cached": False, "complete": False})
+            return
+        if analytical or question_vector is not None:
+            answer_cache.put(question_vector, signature, "".join(tokens), cache_key)
+        yield sse("done", {"cached": False, "complete": True})
+    finally:
+        # Client went away mid-stream
+        hits_task.cancel()
+        vector_task.cancel()
+        if prompt_task is not None:
+            prompt_task.cancel()
+
 # FASTAPI SETUP
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The archive sync runs in the background, so the API is up even if Qdrant isn't yet
+    print(f"Startup: app ready in {time.perf_counter() - IMPORT_STARTED:.2f}s, SQL archive sync running in background")
+    sync_task = asyncio.create_task(keep_archive_in_sync())
+    yield
+    sync_task.cancel()
+
 schema = strawberry.Schema(query=Query)
 graphql_app = GraphQLRouter(schema)
-app = FastAPI(title="Berlin Kultur Intel")
+app = FastAPI(title="Berlin Kultur Intel", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # React's address
@@ -189,6 +694,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.include_router(graphql_app, prefix="/graphql")
+instrument(app)
+
+def cache_metrics():
+    answers, embeddings = answer_cache.stats(), embedding_cache
+    return [("cache_lookups_total", "counter", "Answer and embedding cache lookups by result.", [
+        ({"cache": "answer", "result": "hit"}, answers["hits"]),
+        ({"cache": "answer", "result": "miss"}, answers["misses"]),
+        ({"cache": "answer", "result": "stale"}, answers["stale"]),
+        ({"cache": "embedding", "result": "hit"}, embeddings.hits),
+        ({"cache": "embedding", "result": "miss"}, embeddings.misses),
+    ])]
+
+registry.register_collector(llm_router.metric_families)
+registry.register_collector(cache_metrics)
+
+@app.get("/ask-agent/stream")
+async def ask_agent_stream(question: str):
+    return EventSourceResponse(stream_agent_answer(question))
+
+@app.get("/llm-providers")
+async def llm_provider_stats():
+    return llm_router.stats()
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"answer_cache": answer_cache.stats(), "embedding_cache": await asyncio.to_thread(embedding_cache.stats)}
 
 if __name__ == "__main__":
     import uvicorn
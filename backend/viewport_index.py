@@ -0,0 +1,163 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# In-memory grid index of geocoded events for the map: clusters per zoom level are kept as running
+# counts, so panning and zooming only touches the grid cells in view.
+VIEWPORT_STUB_ZOOM = int(os.getenv("VIEWPORT_STUB_ZOOM", "15"))  # from this zoom on, single events instead of clusters
+VIEWPORT_MAX_STUBS = int(os.getenv("VIEWPORT_MAX_STUBS", "1000"))
+MIN_CLUSTER_ZOOM = 8  # below this the whole city is one or two cells anyway
+CLUSTER_CELLS_PER_TILE = 4  # a cluster covers about 64px of a 256px map tile
+MEMBER_CELL_DEG = 0.01  # grid that holds the events themselves (~1 km)
+# Fields with their own cluster counts, so filtering on one of them stays as cheap as no filter
+FACET_FIELDS = ("district", "collection", "qualityStatus")
+
+
+@dataclass(frozen=True)
+class EventStub:
+    id: str
+    lat: float
+    lng: float
+    eventName: str
+    venueName: str
+    district: str
+    collection: Optional[str]
+    qualityStatus: str
+    vibeProfile: tuple
+
+
+def stub_from_payload(point_id: str, pay: dict) -> Optional[EventStub]:
+    """None for events the geocoder hasn't placed yet."""
+    try:
+        lat, lng = float(pay["lat"]), float(pay["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if (lat, lng) == (0.0, 0.0):
+        return None
+    return EventStub(
+        id=point_id, lat=lat, lng=lng,
+        eventName=pay.get("eventName") or pay.get("EventName") or "Unknown Event",
+        venueName=pay.get("venueName") or pay.get("VenueName") or "",
+        district=pay.get("district") or pay.get("District") or "",
+        collection=pay.get("collection") or pay.get("Collection"),
+        qualityStatus=pay.get("quality_status", "unverified"),
+        vibeProfile=tuple(pay.get("vibeProfile") or ()),
+    )
+
+def facets_of(stub: EventStub) -> list:
+    return [None] + [(name, getattr(stub, name)) for name in FACET_FIELDS if getattr(stub, name)]
+
+def cluster_cell_deg(zoom: int) -> float:
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+def cell_of(lat: float, lng: float, size: float) -> tuple:
+    return int(lat // size), int(lng // size)
+
+CLUSTER_ZOOMS = [(zoom, cluster_cell_deg(zoom)) for zoom in range(MIN_CLUSTER_ZOOM, VIEWPORT_STUB_ZOOM)]
+
+def cells_in(cells: dict, south: float, west: float, north: float, east: float, size: float):
+    """Keys of `cells` overlapping the box; walks the box or the dict, whichever is smaller."""
+    (y0, x0), (y1, x1) = cell_of(south, west, size), cell_of(north, east, size)
+    if (y1 - y0 + 1) * (x1 - x0 + 1) <= len(cells):
+        return [(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1) if (y, x) in cells]
+    return [key for key in cells if y0 <= key[0] <= y1 and x0 <= key[1] <= x1]
+
+
+class ViewportIndex:
+    def __init__(self):
+        self.stubs = {}  # point id -> EventStub
+        self.members = {}  # member cell -> set of point ids
+        self.levels = {}  # facet (None = all events) -> zoom -> cell -> [n, sum lat, sum lng]
+
+    @classmethod
+    def build(cls, stubs: dict) -> "ViewportIndex":
+        index = cls()
+        for stub in stubs.values():
+            index._add(stub)
+        return index
+
+    def _add(self, stub: EventStub):
+        self.stubs[stub.id] = stub
+        self.members.setdefault(cell_of(stub.lat, stub.lng, MEMBER_CELL_DEG), set()).add(stub.id)
+        for facet in facets_of(stub):
+            levels = self.levels.setdefault(facet, {})
+            for zoom, size in CLUSTER_ZOOMS:
+                cells = levels.setdefault(zoom, {})
+                totals = cells.setdefault(cell_of(stub.lat, stub.lng, size), [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += stub.lat
+                totals[2] += stub.lng
+
+    def _remove(self, point_id: str):
+        stub = self.stubs.pop(point_id)
+        key = cell_of(stub.lat, stub.lng, MEMBER_CELL_DEG)
+        self.members[key].discard(point_id)
+        if not self.members[key]:
+            del self.members[key]
+        for facet in facets_of(stub):
+            for zoom, cells in self.levels[facet].items():
+                key = cell_of(stub.lat, stub.lng, cluster_cell_deg(zoom))
+                totals = cells[key]
+                totals[0] -= 1
+                totals[1] -= stub.lat
+                totals[2] -= stub.lng
+                if totals[0] == 0:
+                    del cells[key]
+
+    def diff(self, stubs: dict) -> tuple[list, list]:
+        """(new or changed stubs, ids that are gone) between the index and a fresh scroll of the collection."""
+        changed = [stub for point_id, stub in stubs.items() if self.stubs.get(point_id) != stub]
+        gone = [point_id for point_id in self.stubs if point_id not in stubs]
+        return changed, gone
+
+    def apply(self, changed: list, gone: list):
+        for point_id in gone:
+            self._remove(point_id)
+        for stub in changed:
+            if stub.id in self.stubs:
+                self._remove(stub.id)
+            self._add(stub)
+
+    def _matching(self, south, west, north, east, matches):
+        for key in cells_in(self.members, south, west, north, east, MEMBER_CELL_DEG):
+            for point_id in self.members[key]:
+                stub = self.stubs[point_id]
+                if south <= stub.lat <= north and west <= stub.lng <= east and (matches is None or matches(stub)):
+                    yield stub
+
+    def query(self, south: float, west: float, north: float, east: float, zoom: int, facet: Optional[tuple] = None,
+              matches: Optional[Callable[[EventStub], bool]] = None) -> dict:
+        """Clusters ({lat, lng, count, south, west, north, east}) below VIEWPORT_STUB_ZOOM, event stubs from it on.
+        Without `matches`, clusters come straight from the per-zoom counts of `facet` (e.g. ("district", "Mitte"),
+        None for all events) and cover whole grid cells touching the view; a `matches` predicate clusters the
+        events in view on the fly."""
+        if zoom >= VIEWPORT_STUB_ZOOM:
+            stubs = []
+            total = 0
+            if facet is not None and matches is None:
+                matches = lambda stub: getattr(stub, facet[0]) == facet[1]
+            for stub in self._matching(south, west, north, east, matches):
+                total += 1
+                if len(stubs) < VIEWPORT_MAX_STUBS:
+                    stubs.append(stub)
+            return {"total": total, "clusters": [], "events": stubs, "truncated": total > len(stubs)}
+
+        zoom = max(zoom, MIN_CLUSTER_ZOOM)
+        size = cluster_cell_deg(zoom)
+        if matches is None:
+            cells = self.levels.get(facet, {}).get(zoom, {})
+            totals = {key: cells[key] for key in cells_in(cells, south, west, north, east, size)}
+        else:
+            totals = {}
+            for stub in self._matching(south, west, north, east, matches):
+                entry = totals.setdefault(cell_of(stub.lat, stub.lng, size), [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += stub.lat
+                entry[2] += stub.lng
+
+        clusters = [
+            {"lat": sum_lat / n, "lng": sum_lng / n, "count": n,
+             "south": y * size, "west": x * size, "north": (y + 1) * size, "east": (x + 1) * size}
+            for (y, x), (n, sum_lat, sum_lng) in totals.items()
+        ]
+        return {"total": sum(c["count"] for c in clusters), "clusters": clusters, "events": [], "truncated": False}
@@ -1,79 +1,225 @@
 import requests
-import uuid
+import argparse
 import asyncio
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
-from litellm import embedding
+import sys
+import time
+from qdrant_client.models import PointIdsList, PointStruct
+from litellm import aembedding
+
+# Same point ID and fingerprint scheme as the agent pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents_python"))
+import vector_store
+from vector_store import event_point_id, with_fingerprints, plan_writes, patch_payloads, sparse_vector_for, is_placeholder
+from embedding_cache import embedding_cache
+from collection_config import point_vectors
 
 BASEROW_TOKEN = os.environ.get("BASEROW_TOKEN")
 BASEROW_TABLE_ID = "baserow_table_id_here"  # Replace with your actual Baserow table ID
-QDRANT_URL = "http://localhost:6333"
+BASEROW_URL = os.environ.get("BASEROW_URL", "https://api.baserow.io")  # point at a local stand-in for testing
+BASEROW_PAGE_SIZE = int(os.environ.get("BASEROW_PAGE_SIZE", "200"))  # Baserow caps pages at 200 rows
 COLLECTION_NAME = "berlin_events"
 
-client = QdrantClient(url=QDRANT_URL)
+# Rows per embedding request (the embedding API accepts a list of inputs)
+EMBED_BATCH_SIZE = int(os.environ.get("SYNC_EMBED_BATCH_SIZE", "64"))
+# Points per Qdrant upsert request (and per scroll/delete request when a full sync prunes)
+UPSERT_BATCH_SIZE = int(os.environ.get("SYNC_UPSERT_BATCH_SIZE", "256"))
+# How many upsert batches may be embedding/upserting at the same time
+MAX_BATCHES_IN_FLIGHT = int(os.environ.get("SYNC_MAX_IN_FLIGHT", "4"))
+
+client = vector_store.client  # shared with the agent vault (same URL and collection)
+
+# One pooled HTTP session for every Baserow page request
+session = requests.Session()
+session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=4))
 
 # doing a fresh start (we use vectors of size 3072 and cosine distance)
 # client.delete_collection(collection_name="berlin_events")
 
-async def get_embedding(text: str):
+EMBEDDING_MODEL = "gemini/gemini-embedding-001"
+
+async def get_embeddings(texts: list[str]):
+    """Embeds a batch, serving repeated texts from the shared embedding cache."""
+    vectors = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_MODEL, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if not missing:
+        return vectors
     try:
-        response = embedding(
-            model="gemini/gemini-embedding-001",
-            input=[text]
+        response = await aembedding(
+            model=EMBEDDING_MODEL,
+            input=[texts[i] for i in missing]
         )
-        return response.data[0].embedding
+        fresh = [item["embedding"] if isinstance(item, dict) else item.embedding for item in response.data]
+        await asyncio.to_thread(embedding_cache.put_many, EMBEDDING_MODEL, [texts[i] for i in missing], fresh)
     except Exception as e:
-        print(f"Embedding failed for text: {text[:30]}... Error: {e}")
-        return [0.0] * 3072
+        print(f"Embedding failed for batch of {len(missing)} (first: {texts[missing[0]][:30]}...) Error: {e}")
+        fresh = [[0.0] * 3072 for _ in missing]
+    for i, vector in zip(missing, fresh):
+        vectors[i] = vector
+    return vectors
 
-def get_baserow_rows():
-    url = f"https://api.baserow.io/api/database/rows/table/{BASEROW_TABLE_ID}/?user_field_names=true"
+def iter_baserow_pages(table_id=None, base_url=None, page_size=None):
+    """Yields the rows of each page in turn, following Baserow's `next` links until the table is exhausted."""
+    url = (f"{base_url or BASEROW_URL}/api/database/rows/table/{table_id or BASEROW_TABLE_ID}/"
+           f"?user_field_names=true&size={page_size or BASEROW_PAGE_SIZE}")
     headers = {"Authorization": f"Token {BASEROW_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    return response.json().get("results", [])
+    while url:
+        response = session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        body = response.json()
+        yield body.get("results", [])
+        url = body.get("next")
+
+def get_baserow_rows(**kwargs):
+    return [row for page in iter_baserow_pages(**kwargs) for row in page]
 
-async def sync():
-    print(f"🔄 Starting sync from Baserow Table {BASEROW_TABLE_ID}...")
-    rows = get_baserow_rows()
-    
+async def stream_baserow_rows(**kwargs):
+    """Async iterator over all rows. The next page is already being fetched
+    (in a worker thread) while the rows of the current one are consumed."""
+    pages = iter_baserow_pages(**kwargs)
+    next_page = asyncio.create_task(asyncio.to_thread(next, pages, None))
+    try:
+        while True:
+            page = await next_page
+            if page is None:
+                break
+            next_page = asyncio.create_task(asyncio.to_thread(next, pages, None))
+            for row in page:
+                yield row
+    finally:
+        next_page.cancel()
+
+def row_to_dossier(row: dict) -> dict:
+    # Map Baserow fields to the Qdrant Schema
+    # if QualityScore is "0.00", use verified defaults
+    q_score_raw = float(row.get("QualityScore", 0) or 0)
+
+    return {
+        "eventName": row.get("Event"),
+        "venueName": row.get("Venue"),
+        "district": row.get("District"),
+        "summary": row.get("Summary"),
+        "influenceScore": float(row.get("VibeScore", 0) or 0),
+        "vibeProfile": [v.strip() for v in row.get("VibeProfile", "").split(",")] if row.get("VibeProfile") else [],
+        "collection":row.get("Collection"),
+        "url": row.get("URL"),
+        "quality_score": 1.0 if q_score_raw == 0 else q_score_raw,
+        "quality_reason": row.get("AuditReason") or "Verified via local fallback.",
+        "quality_status": row.get("DeepEvalAuditStatus") or "verified"
+    }
+
+def searchable_text(dossier: dict) -> str:
+    return f"{dossier['eventName']} at {dossier['venueName']}. Vibe: {', '.join(dossier['vibeProfile'])}. {dossier['summary']}"
+
+async def sync_batch(rows: list[dict], full: bool = False) -> dict:
+    """Syncs one upsert batch. Only rows whose embedding text changed are embedded (in
+    EMBED_BATCH_SIZE chunks) and upserted; payload-only changes become set_payload calls."""
+    entries = []
+    texts = {}
     for row in rows:
-        # 1. Map Baserow fields to the Qdrant Schema
-        # if QualityScore is "0.00", use verified defaults
-        q_score_raw = float(row.get("QualityScore", 0) or 0)
-        
-        dossier = {
-            "eventName": row.get("Event"),
-            "venueName": row.get("Venue"),
-            "district": row.get("District"),
-            "summary": row.get("Summary"),
-            "influenceScore": float(row.get("VibeScore", 0) or 0),
-            "vibeProfile": [v.strip() for v in row.get("VibeProfile", "").split(",")] if row.get("VibeProfile") else [],
-            "collection":row.get("Collection"),
-            "url": row.get("URL"),
-            "quality_score": 1.0 if q_score_raw == 0 else q_score_raw,
-            "quality_reason": row.get("AuditReason") or "Verified via local fallback.",
-            "quality_status": row.get("DeepEvalAuditStatus") or "verified"
-        }
-
-        # 2. Generating the searchable text block for the embedding
-        searchable_text = f"{dossier['eventName']} at {dossier['venueName']}. Vibe: {', '.join(dossier['vibeProfile'])}. {dossier['summary']}"
-        
-        # 3. Getting the real vector
-        vector = await get_embedding(searchable_text)
-
-        # 4. Upserting to Qdrant
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[
-                PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vector,
-                    payload=dossier
-                )
-            ]
+        dossier = row_to_dossier(row)
+        point_id = event_point_id(dossier)
+        texts[point_id] = searchable_text(dossier)
+        entries.append((point_id, with_fingerprints(dossier, texts[point_id])))
+
+    to_embed, to_patch, unchanged = await asyncio.to_thread(plan_writes, entries, full)
+    failed = 0
+
+    if to_embed:
+        chunks = [to_embed[i:i + EMBED_BATCH_SIZE] for i in range(0, len(to_embed), EMBED_BATCH_SIZE)]
+        embedded = await asyncio.gather(*(get_embeddings([texts[pid] for pid, _ in c]) for c in chunks))
+        vectors = [v for chunk in embedded for v in chunk]
+        # Rows whose embedding failed are left out, so they still look new to the next incremental sync
+        points = [
+            PointStruct(id=point_id, vector=point_vectors(vector, sparse_vector_for(payload)), payload=payload)
+            for (point_id, payload), vector in zip(to_embed, vectors) if not is_placeholder(vector)
+        ]
+        failed = len(to_embed) - len(points)
+        to_embed = [entry for entry, vector in zip(to_embed, vectors) if not is_placeholder(vector)]
+        if points:
+            await asyncio.to_thread(client.upsert, collection_name=COLLECTION_NAME, points=points)
+    await asyncio.to_thread(patch_payloads, to_patch)
+
+    print(f"Synced batch of {len(rows)}: {len(to_embed)} embedded, {len(to_patch)} payload-only, "
+          f"{len(unchanged)} unchanged, {failed} failed")
+    return {"embedded": len(to_embed), "patched": len(to_patch), "unchanged": len(unchanged), "failed": failed}
+
+def is_baserow_point(payload: dict) -> bool:
+    """Points written by this sync (row_to_dossier always sets these keys); agent dossiers have neither."""
+    return "collection" in payload and "url" in payload
+
+def delete_stale_points(keep: set[str]) -> int:
+    """Deletes the Baserow-sourced points whose ID isn't in keep: rows removed from the table
+    and the uuid4 duplicates written before point IDs were derived from the event."""
+    stale = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=COLLECTION_NAME, limit=UPSERT_BATCH_SIZE, offset=offset,
+            with_payload=["collection", "url"], with_vectors=False,
         )
-        print(f"Synced: {dossier['eventName']}")
+        stale.extend(p.id for p in points if str(p.id) not in keep and is_baserow_point(p.payload or {}))
+        if offset is None:
+            break
+    for i in range(0, len(stale), UPSERT_BATCH_SIZE):
+        client.delete(collection_name=COLLECTION_NAME, points_selector=PointIdsList(points=stale[i:i + UPSERT_BATCH_SIZE]))
+    return len(stale)
+
+async def sync(full: bool = False):
+    mode = "full rebuild" if full else "incremental"
+    print(f"🔄 Starting {mode} sync from Baserow Table {BASEROW_TABLE_ID}...")
+    started = time.perf_counter()
+
+    # Fetching, embedding and upserting overlap: batches are dispatched as soon as
+    # enough rows have streamed in. The semaphore is taken before a batch is
+    # scheduled, so at most MAX_BATCHES_IN_FLIGHT batches are ever buffered or running.
+    in_flight = asyncio.Semaphore(MAX_BATCHES_IN_FLIGHT)
+    tasks = []
+    total_rows = 0
+    seen = set()  # point IDs of every row in the table, pruned against after a full sync
+
+    async def run_batch(batch):
+        try:
+            return await sync_batch(batch, full)
+        except Exception as e:
+            print(f"Batch of {len(batch)} failed: {e}")
+            return {}
+        finally:
+            in_flight.release()
+
+    async def dispatch(batch):
+        await in_flight.acquire()
+        tasks.append(asyncio.create_task(run_batch(batch)))
+
+    batch = []
+    async for row in stream_baserow_rows():
+        batch.append(row)
+        total_rows += 1
+        seen.add(event_point_id(row_to_dossier(row)))
+        if len(batch) >= UPSERT_BATCH_SIZE:
+            await dispatch(batch)
+            batch = []
+    if batch:
+        await dispatch(batch)
+
+    totals = {"embedded": 0, "patched": 0, "unchanged": 0, "failed": 0}
+    for stats in await asyncio.gather(*tasks):
+        for k, v in stats.items():
+            totals[k] += v
+    synced = totals["embedded"] + totals["patched"] + totals["unchanged"]
+    elapsed = time.perf_counter() - started
+    print(f"✅ Synced {synced}/{total_rows} rows in {elapsed:.1f}s ({synced / elapsed if elapsed else 0:.1f} rows/sec) - "
+          f"{totals['embedded']} embedded, {totals['patched']} payload-only, {totals['unchanged']} unchanged, "
+          f"{totals['failed']} failed (retried next run)")
+
+    if full:
+        # Only after the whole table was read: a row whose batch failed still keeps its old point
+        deleted = await asyncio.to_thread(delete_stale_points, seen)
+        print(f"🧹 Deleted {deleted} Baserow points not in the table (removed rows, legacy duplicates)")
 
 if __name__ == "__main__":
-    asyncio.run(sync())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync a Baserow table into the Qdrant berlin_events collection.")
+    parser.add_argument("--full", action="store_true", help="re-embed and upsert every row, ignoring stored fingerprints, then delete Baserow points no row maps to")
+    args = parser.parse_args()
+    asyncio.run(sync(full=args.full))
@@ -0,0 +1,73 @@
+import random
+
+# Synthetic Berlin events, deterministic for a given seed so runs are comparable
+DISTRICTS = {
+    "Mitte": (52.5200, 13.4050), "Kreuzberg": (52.4986, 13.4030), "Friedrichshain": (52.5155, 13.4540),
+    "Neukölln": (52.4811, 13.4350), "Prenzlauer Berg": (52.5389, 13.4244), "Charlottenburg": (52.5167, 13.3041),
+    "Schöneberg": (52.4833, 13.3500), "Wedding": (52.5500, 13.3667), "Moabit": (52.5305, 13.3421),
+    "Treptow": (52.4930, 13.4620), "Lichtenberg": (52.5150, 13.4990), "Tempelhof": (52.4700, 13.3850),
+}
+COLLECTIONS = ["FebruaryEvents", "MarchEvents", "AprilEvents", "ExhibitionEvents", "FestivalEvents"]
+VENUE_KINDS = ["Halle", "Club", "Galerie", "Theater", "Kino", "Bar", "Garten", "Studio", "Saal", "Werk"]
+VENUE_NAMES = ["Spree", "Tresor", "Kraft", "Licht", "Beton", "Ufer", "Nord", "Rosen", "Mond", "Funk", "Kiez", "Ost"]
+ADJECTIVES = ["Late", "Deep", "Open", "Golden", "Wild", "Quiet", "Electric", "Sweet", "Dark", "Sunday", "Analog", "Radical"]
+NOUNS = ["Night", "Market", "Session", "Salon", "Rave", "Tasting", "Screening", "Reading", "Festival", "Exhibition", "Jam", "Brunch"]
+VIBES = ["techno", "jazz", "queer", "experimental", "family", "street food", "vegan", "ambient", "hip hop", "classical",
+         "art", "dessert", "outdoor", "underground", "literature", "film", "dance", "craft beer", "vintage", "electronic"]
+SUMMARY_OPENERS = ["An evening of", "A weekend of", "A celebration of", "A late-night session of", "An afternoon of"]
+SUMMARY_CLOSERS = ["in a converted factory", "by the canal", "under the railway arches", "in a courtyard garden",
+                   "with resident DJs", "with local makers", "in an old ballroom"]
+
+
+def synthetic_events(count: int, seed: int = 42) -> list[dict]:
+    """Raw scrapes shaped like the Mastra output posted to /validate-and-store (plus lat/lng and collection)."""
+    rng = random.Random(seed)
+    venues = [f"{rng.choice(VENUE_NAMES)}{rng.choice(VENUE_KINDS).lower()} {i}" for i in range(max(20, count // 20))]
+    districts = list(DISTRICTS)
+    events = []
+    for i in range(count):
+        district = rng.choice(districts)
+        lat, lng = DISTRICTS[district]
+        vibes = rng.sample(VIBES, 3)
+        events.append({
+            "eventName": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} #{i}",
+            "venueName": rng.choice(venues),
+            "district": district,
+            "vibeProfile": vibes,
+            "influenceScore": rng.randint(10, 95),
+            "confidenceScore": rng.randint(6, 10),
+            "summary": f"{rng.choice(SUMMARY_OPENERS)} {vibes[0]} and {vibes[1]} {rng.choice(SUMMARY_CLOSERS)}.",
+            "collection": rng.choice(COLLECTIONS),
+            "url": f"https://example.berlin/events/{i}",
+            "lat": round(lat + rng.uniform(-0.02, 0.02), 6),
+            "lng": round(lng + rng.uniform(-0.03, 0.03), 6),
+        })
+    return events
+
+def to_baserow_row(event: dict) -> dict:
+    """The same event as a row of the Baserow table read by sync_baserow_to_qdrant.py."""
+    return {
+        "Event": event["eventName"],
+        "Venue": event["venueName"],
+        "District": event["district"],
+        "Summary": event["summary"],
+        "VibeScore": event["influenceScore"],
+        "VibeProfile": ", ".join(event["vibeProfile"]),
+        "Collection": event["collection"],
+        "URL": event["url"],
+        "QualityScore": "0.00",
+        "DeepEvalAuditStatus": "verified",
+    }
+
+def synthetic_questions(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    templates = [
+        "I'm craving something {vibe} in {district}",
+        "Any {vibe} events this weekend?",
+        "Where can I find {vibe} and {vibe2} near {district}?",
+        "How many {vibe} events are in {district}?",
+    ]
+    return [
+        rng.choice(templates).format(vibe=rng.choice(VIBES), vibe2=rng.choice(VIBES), district=rng.choice(list(DISTRICTS)))
+        for _ in range(count)
+    ]
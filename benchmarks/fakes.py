@@ -0,0 +1,127 @@
+import re
+import json
+import asyncio
+import hashlib
+from types import SimpleNamespace
+import numpy as np
+
+# Offline stand-ins for the remote services. Each one sleeps for a configurable latency so the
+# benchmark measures our own overhead plus a realistic amount of waiting, never the network.
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """Deterministic feature-hashing embedding: texts sharing words get similar vectors."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "big") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeEmbedder:
+    def __init__(self, dim: int, latency: float):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    async def embed(self, text: str) -> list[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return fake_embedding(text, self.dim)
+
+    async def aembedding(self, model: str, input: list[str], **kwargs):
+        """Drop-in for litellm.aembedding (one round-trip per batch)."""
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=fake_embedding(t, self.dim)) for t in input])
+
+
+def _message(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def _chunk(token: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+class FakeLLM:
+    """Drop-in for litellm.acompletion. Recognizes the prompts the app sends (fast-lane dossier,
+    DeepEval faithfulness steps, Text2SQL) and answers each with something the caller can parse."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def answer(self, messages: list[dict]) -> str:
+        prompt = messages[-1]["content"]
+        if '"verdicts"' in prompt:
+            return json.dumps({"verdicts": [{"verdict": "yes"}, {"verdict": "yes"}]})
+        if '"truths"' in prompt:
+            return json.dumps({"truths": ["The event takes place in Berlin."]})
+        if '"claims"' in prompt:
+            return json.dumps({"claims": ["The event takes place in Berlin.", "It is worth a visit."]})
+        if "matching this schema" in prompt:
+            raw = json.loads(prompt.split("\n", 1)[1].split("\n\n", 1)[0])
+            return json.dumps({
+                "eventName": raw.get("eventName", ""), "venueName": raw.get("venueName", ""),
+                "district": raw.get("district", ""), "vibeProfile": raw.get("vibeProfile", []),
+                "influenceScore": int(raw.get("influenceScore", 50)), "confidenceScore": 9,
+                "summary": raw.get("summary", ""),
+            })
+        if "SQLite query" in prompt:
+            return "SELECT district, COUNT(*) FROM historical_events GROUP BY district"
+        return "Berlin has you covered: try the first match, it fits the vibe and is easy to reach tonight."
+
+    async def acompletion(self, model: str, messages: list[dict], stream: bool = False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = self.answer(messages)
+        if not stream:
+            return _message(content)
+
+        async def chunks():
+            for token in re.findall(r"\S+\s*", content):
+                await asyncio.sleep(0)
+                yield _chunk(token)
+        return chunks()
+
+
+class FakeTavily:
+    """Async Tavily stand-in for build_verifier_graph: every query finds one page that names the event."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def search(self, query: str, search_depth: str = "basic", **kwargs) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        slug = hashlib.md5(query.encode("utf-8")).hexdigest()[:12]
+        return {"results": [{"url": f"https://example.berlin/{slug}", "title": query, "content": query}]}
+
+
+class FakeCrewPool:
+    """Stand-in for crew.CrewPool: one 'crew run' per event, taking `latency` seconds."""
+
+    def __init__(self, output_model, latency: float, size: int = 4):
+        self.output_model = output_model
+        self.latency = latency
+        self.slots = asyncio.Semaphore(size)
+        self.calls = 0
+
+    async def kickoff(self, event_raw_data: dict):
+        async with self.slots:
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+        fields = {name: event_raw_data.get(name) for name in self.output_model.model_fields}
+        fields["summary"] = f"{fields.get('summary') or ''} Polished by the crew."
+        return SimpleNamespace(pydantic=self.output_model(**fields))
+
+
+def fake_coords(venue, district):
+    """Deterministic coordinates around Berlin for the inline geocoder."""
+    digest = hashlib.md5(f"{venue}|{district}".encode("utf-8")).digest()
+    return 52.45 + digest[0] / 255 * 0.15, 13.25 + digest[1] / 255 * 0.3
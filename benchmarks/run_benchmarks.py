@@ -0,0 +1,297 @@
+# Offline performance benchmarks: Baserow sync, the ingestion pipeline and the GraphQL API, run against
+# Qdrant's in-process mode with fake embedder/LLM/Tavily/crew stand-ins (see fakes.py). Each corpus size
+# runs in its own process so peak RSS and module-level caches don't leak between sizes.
+#
+# Usage: python benchmarks/run_benchmarks.py [--sizes 1000,10000,100000] [--output results.json]
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "agents_python"))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+from corpus import synthetic_events, synthetic_questions, to_baserow_row
+
+SEARCH_EVENTS_QUERY = "query($q: String!) { searchEvents(queryText: $q, limit: 5) { eventName lat lng } }"
+ASK_AGENT_QUERY = "query($q: String!) { askAgent(question: $q) { answer matches { eventName } } }"
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)  # bytes on macOS, KiB on Linux
+
+def latency_summary(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+    return {"count": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 2)}
+
+def load_module(name: str, path: str):
+    # agents_python/main.py and backend/main.py are both "main"; load them under distinct names
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class SerializedClient:
+    """Qdrant's local mode isn't thread-safe, and the app calls the sync client from worker threads
+    (asyncio.to_thread). A server doesn't need this; here every call takes one lock."""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+async def run_load(call, items: list, concurrency: int):
+    """Runs call(item) for every item with `concurrency` workers. Returns (latencies, results, elapsed)."""
+    latencies, results = [], [None] * len(items)
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(items):
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            results[i] = await call(items[i])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return latencies, results, time.perf_counter() - started
+
+def configure_environment(workdir: str, args):
+    """Must run before any repo module is imported: they read their settings at import time."""
+    os.environ.update({
+        "VECTOR_DIM": str(args.dim),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+        "GEOCODE_CACHE_PATH": os.path.join(workdir, "geocode_cache.db"),
+        "VERIFICATION_CACHE_PATH": os.path.join(workdir, "verification_cache.db"),
+        "DEDUP_INDEX_PATH": os.path.join(workdir, "dedup_index.db"),
+        "EVAL_CACHE_PATH": os.path.join(workdir, "eval_cache.db"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "ingest_jobs.db"),
+        "GOOGLE_API_KEY": "benchmark", "GROQ_API_KEY": "benchmark", "TAVILY_API_KEY": "benchmark",
+        "CREW_RPM": "0",
+        "LLM_HEDGING": "false",  # fake latencies are constant, hedges would only add noise
+    })
+    if args.lane != "auto":
+        os.environ["FAST_LANE"] = "all" if args.lane == "fast" else "off"
+    os.chdir(workdir)  # the backend keeps its SQL archive in ./berlin_history.db
+
+
+async def bench_sync(args, events, qdrant_client, embedder) -> dict:
+    import vector_store
+    sync_module = load_module("sync_baserow_to_qdrant", os.path.join(REPO_DIR, "baserow", "sync_baserow_to_qdrant.py"))
+    sync_module.client = qdrant_client
+    sync_module.aembedding = embedder.aembedding
+    rows = [to_baserow_row(e) for e in events]
+    page_size = sync_module.BASEROW_PAGE_SIZE
+    sync_module.iter_baserow_pages = lambda **kwargs: (rows[i:i + page_size] for i in range(0, len(rows), page_size))
+    vector_store.init_db()
+
+    results = {}
+    for label, full in (("initial", False), ("unchanged", False), ("full_rebuild", True)):
+        started = time.perf_counter()
+        await sync_module.sync(full=full)
+        elapsed = time.perf_counter() - started
+        results[label] = {"rows": len(rows), "seconds": round(elapsed, 3), "rows_per_sec": round(len(rows) / elapsed, 1)}
+    results["points"] = qdrant_client.count(collection_name=vector_store.COLLECTION_NAME, exact=True).count
+    return results
+
+async def bench_ingestion(args, qdrant_client, embedder, llm) -> dict:
+    from fakes import FakeCrewPool, FakeTavily, fake_coords
+    import vector_store
+    try:
+        import dedup
+        import fast_lane
+        import graph
+        agent_main = load_module("agent_main", os.path.join(REPO_DIR, "agents_python", "main.py"))
+    except ImportError as e:
+        # crewai/deepeval are heavy optional installs; the other phases still run without them
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    dedup.client = qdrant_client
+    vector_store.aembedding = embedder.aembedding
+    vector_store.get_coords = fake_coords
+    fast_lane.acompletion = llm.acompletion
+    tavily = FakeTavily(args.tavily_latency_ms / 1000)
+    agent_main.app_graph = graph.build_verifier_graph(tavily, graph.VerificationCache())
+    agent_main.crew_pool = FakeCrewPool(agent_main.CulturalDossier, args.crew_latency_ms / 1000)
+
+    events = [dict(e, eventName=f"Ingest {e['eventName']}") for e in synthetic_events(args.ingest_events, seed=args.seed + 1)]
+    for e in events:
+        for key in ("lat", "lng", "collection", "url"):
+            e.pop(key)  # shaped like the Mastra scrape: no coordinates yet
+    latencies, results, elapsed = await run_load(agent_main.process_event, events, args.ingest_concurrency)
+    return {
+        "events": len(events),
+        "concurrency": args.ingest_concurrency,
+        "seconds": round(elapsed, 3),
+        "events_per_sec": round(len(events) / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "statuses": dict(Counter(r.get("status") for r in results)),
+        "lanes": dict(Counter(r.get("lane") for r in results if r.get("lane"))),
+        "tavily_calls": tavily.calls,
+    }
+
+async def bench_queries(args, qdrant_path, embedder) -> dict:
+    from httpx import ASGITransport, AsyncClient
+    from qdrant_client import AsyncQdrantClient
+    backend_main = load_module("backend_main", os.path.join(REPO_DIR, "backend", "main.py"))
+    backend_main.async_qdrant = AsyncQdrantClient(path=qdrant_path)
+    backend_main.get_query_embedding = embedder.embed
+
+    archive = await backend_main.sync_qdrant_to_sql(full=True)
+    questions = synthetic_questions(args.queries, seed=args.seed + 2)
+    results = {"archive_sync": archive}
+
+    async with AsyncClient(transport=ASGITransport(app=backend_main.app), base_url="http://bench", timeout=120) as http:
+        for label, query in (("searchEvents", SEARCH_EVENTS_QUERY), ("askAgent", ASK_AGENT_QUERY)):
+            async def call(question):
+                response = await http.post("/graphql", json={"query": query, "variables": {"q": question}})
+                return response.status_code == 200 and not response.json().get("errors")
+
+            latencies, ok, elapsed = await run_load(call, questions, args.query_concurrency)
+            results[label] = {
+                "requests": len(questions),
+                "concurrency": args.query_concurrency,
+                "errors": ok.count(False),
+                "requests_per_sec": round(len(questions) / elapsed, 1),
+                "latency": latency_summary(latencies),
+            }
+    results["answer_cache"] = backend_main.answer_cache.stats()
+    await backend_main.async_qdrant.close()
+    return results
+
+async def run_size(size: int, args) -> dict:
+    import litellm
+    from qdrant_client import QdrantClient
+    from fakes import FakeEmbedder, FakeLLM
+    import vector_store
+
+    embedder = FakeEmbedder(args.dim, args.embed_latency_ms / 1000)
+    llm = FakeLLM(args.llm_latency_ms / 1000)
+    litellm.acompletion = llm.acompletion  # evals and the backend router look it up at call time
+
+    # Local (on-disk) mode, so the sync client of the ingest phases and the async client of the API
+    # phase can open the same collection one after the other
+    qdrant_path = os.path.join(os.getcwd(), "qdrant")
+    qdrant_client = SerializedClient(QdrantClient(path=qdrant_path))
+    vector_store.client = qdrant_client
+
+    report = {"corpus_size": size}
+    events = synthetic_events(size, seed=args.seed)
+    print(f"[bench] size={size}: sync")
+    report["sync"] = await bench_sync(args, events, qdrant_client, embedder)
+    report["peak_rss_mb_after_sync"] = peak_rss_mb()
+    print(f"[bench] size={size}: ingestion")
+    report["ingestion"] = await bench_ingestion(args, qdrant_client, embedder, llm)
+    report["peak_rss_mb_after_ingestion"] = peak_rss_mb()
+    qdrant_client.close()
+
+    print(f"[bench] size={size}: queries")
+    report["queries"] = await bench_queries(args, qdrant_path, embedder)
+    report["fake_calls"] = {"embedder": embedder.calls, "llm": llm.calls}
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def child_args(args, size: int, output: str) -> list[str]:
+    argv = [sys.executable, os.path.abspath(__file__), "--single", str(size), "--output", output]
+    for name in ("dim", "seed", "lane", "ingest_events", "ingest_concurrency", "queries", "query_concurrency",
+                 "embed_latency_ms", "llm_latency_ms", "tavily_latency_ms", "crew_latency_ms"):
+        argv += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    return argv
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for sync, ingestion and the GraphQL API.")
+    parser.add_argument("--sizes", default="1000", help="comma-separated corpus sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--dim", type=int, default=256, help="vector size (sets VECTOR_DIM)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--lane", choices=["auto", "fast", "full"], default="full", help="ingestion lane")
+    parser.add_argument("--ingest-events", type=int, default=200)
+    parser.add_argument("--ingest-concurrency", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200, help="requests per GraphQL operation")
+    parser.add_argument("--query-concurrency", type=int, default=16)
+    parser.add_argument("--embed-latency-ms", type=float, default=30)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--tavily-latency-ms", type=float, default=150)
+    parser.add_argument("--crew-latency-ms", type=float, default=1500)
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)  # internal: run one size in this process
+    args = parser.parse_args()
+
+    if args.single is not None:
+        workdir = tempfile.mkdtemp(prefix="berlin_bench_")
+        configure_environment(workdir, args)
+        report = asyncio.run(run_size(args.single, args))
+        with open(args.output, "w") as f:
+            json.dump(report, f)
+        shutil.rmtree(workdir, ignore_errors=True)
+        return
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "single")},
+            "qdrant_layout": {k: os.environ[k] for k in os.environ if k.startswith("QDRANT_")},
+        },
+        "runs": [],
+    }
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            output = tmp.name
+        # Progress and the app's own logging go to stderr; stdout stays clean for the JSON report
+        completed = subprocess.run(child_args(args, size, output), stdout=sys.stderr)
+        if completed.returncode != 0:
+            report["runs"].append({"corpus_size": size, "error": f"exit code {completed.returncode}"})
+            continue
+        with open(output) as f:
+            report["runs"].append(json.load(f))
+        os.unlink(output)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,47 @@
-import { useState } from 'react';
-import { ApolloClient, InMemoryCache, gql, useLazyQuery } from '@apollo/client';
+import { useRef, useState } from 'react';
 import MapView from './Map';
 import Sidebar from './Sidebar';
 
-// Connecting to the Python FastAPI Backend
-const client = new ApolloClient({
-  uri: 'http://localhost:8000/graphql',
-  cache: new InMemoryCache(),
-});
-
-const ASK_AGENT = gql`
-  query AskAgent($question: String!) {
-    askAgent(question: $question) {
-      answer
-      matches {
-        eventName
-        venueName    
-        summary
-        lat
-        lng
-        url
-        collection
-        district
-      }
-    }
-  }
-`;
+// Connecting to the Python FastAPI Backend.
+// Answers are streamed over server-sent events: the matched events arrive as soon as the
+// vector search returns, then the answer text token by token.
+const ASK_AGENT_STREAM_URL = 'http://localhost:8000/ask-agent/stream';
 
 function App() {
   const [events, setEvents] = useState([]);
   const [agentAnswer, setAgentAnswer] = useState("");
+  const [loading, setLoading] = useState(false);
+  const sourceRef = useRef(null);
+
+  const askAgent = (question) => {
+    if (sourceRef.current) sourceRef.current.close(); // a newer question replaces the running one
+    setEvents([]);
+    setAgentAnswer("");
+    setLoading(true);
+
+    const source = new EventSource(`${ASK_AGENT_STREAM_URL}?question=${encodeURIComponent(question)}`);
+    sourceRef.current = source;
 
-  const [askAgent, { loading }] = useLazyQuery(ASK_AGENT, {
-    client,
-    onCompleted: (data) => {
-      setEvents(data.askAgent.matches); // Updating pins on map
-      setAgentAnswer(data.askAgent.answer); // Updating text box
-    },
-  });
+    source.addEventListener('matches', (e) => {
+      setEvents(JSON.parse(e.data)); // Updating pins on map
+      setLoading(false);
+    });
+    source.addEventListener('token', (e) => {
+      const token = JSON.parse(e.data);
+      setAgentAnswer((prev) => prev + token); // Updating text box
+    });
+    source.addEventListener('done', () => source.close());
+    source.onerror = () => {
+      // Without close() the browser would reconnect and ask the question again
+      source.close();
+      setLoading(false);
+    };
+  };
 
   return (
   <div style={{ display: 'flex', height: '100vh', width: '100vw' }}>
-    <Sidebar 
-      onSearch={(q) => askAgent({ variables: { question: q } })} 
+    <Sidebar
+      onSearch={askAgent}
       answer={agentAnswer}
       events={events}
       loading={loading}
@@ -52,4 +51,4 @@ function App() {
 );
 }
 
-export default App;
\ No newline at end of file
+export default App;
@@ -5,6 +5,31 @@ import { eventSchema } from './mastra/agents/scout';
 const app = express();
 app.use(express.json());
 
+const PYTHON_URL = process.env.PYTHON_URL || 'http://localhost:8000';
+const JOB_POLL_MS = 2000;
+const JOB_TIMEOUT_MS = 570000; // just under server.timeout
+
+async function getJob(jobId: string): Promise<Response> {
+  return fetch(`${PYTHON_URL}/jobs/${encodeURIComponent(jobId)}`);
+}
+
+// Only for callers that opt in with ?wait=true: holds the request open until the job has finished
+async function waitForJob(jobId: string): Promise<any> {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await getJob(jobId);
+    if (!response.ok) {
+      throw new Error(`Python job status error: ${await response.text()}`);
+    }
+    const job = await response.json();
+    if (job.status === 'done' || job.status === 'dead') {
+      return job;
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+  }
+  throw new Error(`Python job ${jobId} still not finished after ${JOB_TIMEOUT_MS / 1000}s (GET /jobs/${jobId} on the Python API)`);
+}
+
 app.post('/scout', async (req, res) => {
   const { url } = req.body;
   
@@ -64,8 +89,8 @@ app.post('/scout', async (req, res) => {
     
     console.log("Data validated, sending to Python audit:", validatedData.eventName);
 
-    // PYTHON LAYER HANDOFF
-    const pythonResponse = await fetch('http://localhost:8000/validate-and-store', {
+    // PYTHON LAYER HANDOFF: the event is queued and the caller gets the job to poll (GET /jobs/:id on this bridge)
+    const pythonResponse = await fetch(`${PYTHON_URL}/validate-and-store`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(validatedData)
@@ -76,8 +101,18 @@ app.post('/scout', async (req, res) => {
         throw new Error(`Python Audit Error: ${errorText}`);
     }
 
-    const finalResult = await pythonResponse.json();
-    res.json(finalResult);
+    const { job_id, status } = await pythonResponse.json();
+    if (req.query.wait !== 'true') {
+        const statusUrl = `${req.protocol}://${req.get('host')}/jobs/${job_id}`;
+        return res.status(202).location(statusUrl).json({ job_id, status, status_url: statusUrl });
+    }
+
+    const job = await waitForJob(job_id);
+    if (job.status === 'dead') {
+        throw new Error(`Python Audit Error (job ${job_id} failed after ${job.attempts} attempts): ${job.error}`);
+    }
+
+    res.json(job.result);
 
   } catch (error: any) {
     console.error('Pipeline Error:', error.message);
@@ -97,6 +132,16 @@ app.post('/scout', async (req, res) => {
   }
 });
 
+// Job status passthrough, so n8n only ever talks to the bridge
+app.get('/jobs/:id', async (req, res) => {
+  try {
+    const response = await getJob(req.params.id);
+    res.status(response.status).json(await response.json());
+  } catch (error: any) {
+    res.status(502).json({ error: 'Python API unreachable', details: error.message });
+  }
+});
+
 const server = app.listen(3000, () => {
   console.log('Mastra Signal Processor on port 3000 ...');
 });
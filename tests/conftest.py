@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# The services are flat script directories; their modules import each other by bare name
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for directory in ("agents_python", "backend", "baserow"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# Module-level caches and queues open their SQLite files at import time: keep them out of the repo
+_scratch = tempfile.mkdtemp(prefix="berlin_tests_")
+for name, filename in (("EMBEDDING_CACHE_PATH", "embedding_cache.db"), ("GEOCODE_CACHE_PATH", "geocode_cache.db"),
+                       ("VERIFICATION_CACHE_PATH", "verification_cache.db"), ("DEDUP_INDEX_PATH", "dedup_index.db"),
+                       ("EVAL_CACHE_PATH", "eval_cache.db"), ("JOB_QUEUE_PATH", "ingest_jobs.db")):
+    os.environ.setdefault(name, os.path.join(_scratch, filename))
+os.environ.setdefault("TAVILY_API_KEY", "test")
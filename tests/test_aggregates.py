@@ -0,0 +1,64 @@
+from aggregates import AggregateQuery, Vocabulary, aggregate_sql, format_answer, is_read_only, parse_question
+
+ROWS = [
+    ("Mitte", "MarchEvents", "March", "verified"),
+    ("Neukölln", "FebruaryEvents", "February", "flagged"),
+    ("Friedrichshain-Kreuzberg", "FestivalEvents", None, "verified"),
+    ("Berlin (multiple districts)", "ExhibitionEvents", None, "verified"),
+]
+VOCABULARY = Vocabulary(ROWS)
+
+
+def test_count_with_filters():
+    query = parse_question("How many events in Neukölln in February?", VOCABULARY)
+    assert query.filters == {"district": ["Neukölln"], "month": ["February"]} and query.group_by is None
+
+
+def test_breakdowns():
+    assert parse_question("Number of events per district", VOCABULARY).group_by == "district"
+    assert parse_question("Give me a breakdown of exhibition events by month", VOCABULARY) == AggregateQuery(
+        filters={"collection": ["ExhibitionEvents"]}, group_by="month")
+    query = parse_question("What's the average number of events per district?", VOCABULARY)
+    assert query.average and query.group_by == "district"
+
+
+def test_festival_events_in_a_month_go_to_the_fallback():
+    # Festival rows have no month, so the aggregates would confidently answer 0
+    assert parse_question("how many festival events in March", VOCABULARY) is None
+    assert parse_question("How many festivals are there in March?", VOCABULARY) is None
+    assert parse_question("how many festival events", VOCABULARY).filters == {"collection": ["FestivalEvents"]}
+
+
+def test_questions_the_aggregates_cannot_answer():
+    assert parse_question("How many techno events are in Mitte?", VOCABULARY) is None  # "techno" is no dimension
+    assert parse_question("Which events are in Mitte?", VOCABULARY) is None  # not a count
+    assert parse_question("Average events in Mitte", VOCABULARY) is None  # average over nothing
+    assert parse_question("count events per district per month", VOCABULARY) is None  # two breakdowns
+
+
+def test_multi_district_label_is_no_filter():
+    assert all(dimension != "district" or "berlin" not in phrase for phrase, dimension, _ in VOCABULARY.phrases)
+
+
+def test_sql_and_answer():
+    query = parse_question("how many events in Mitte", VOCABULARY)
+    sql, params = aggregate_sql(query)
+    assert sql == "SELECT COALESCE(SUM(n), 0) FROM event_aggregates WHERE district IN (:district_0)"
+    assert params == {"district_0": "Mitte"}
+    assert format_answer(query, [(1,)]) == "There is 1 event in Mitte."
+    breakdown = AggregateQuery(group_by="month")
+    assert format_answer(breakdown, [(None, 3), ("March", 2)]) == "5 events in the archive by month: no month: 3, March: 2."
+
+
+def test_is_read_only():
+    assert is_read_only("SELECT COUNT(*) FROM historical_events WHERE district = 'Mitte';")
+    assert is_read_only("WITH t AS (SELECT * FROM historical_events) SELECT COUNT(*) FROM t")
+    assert is_read_only("SELECT COUNT(*) FROM historical_events WHERE eventName = 'drop table night'")
+    assert not is_read_only("DELETE FROM historical_events")
+    assert not is_read_only("SELECT 1; DROP TABLE historical_events")
+    assert not is_read_only("WITH x AS (SELECT 1) INSERT INTO historical_events SELECT * FROM x")
+    assert not is_read_only("PRAGMA writable_schema = 1")
+    assert is_read_only("SELECT replace(venueName, 'Berlin', '') AS venue, COUNT(*) FROM historical_events GROUP BY venue")
+    assert is_read_only('SELECT "update" FROM historical_events')
+    assert not is_read_only("WITH x AS (SELECT 1) REPLACE INTO historical_events SELECT * FROM x")
+    assert not is_read_only("WITH x AS (SELECT 1) REPLACE  INTO historical_events(eventName) SELECT * FROM x")
@@ -0,0 +1,30 @@
+from answer_cache import SemanticAnswerCache
+
+
+def test_keyed_answers_need_no_vector():
+    cache = SemanticAnswerCache()
+    cache.put(None, ("sql",), "12 events", key="how many events in mitte")
+    assert cache.get(None, ("sql",), key="how many events in mitte") == "12 events"
+    assert cache.get(None, ("sql",), key="how many events in neukolln") is None
+    # A semantic lookup never returns a keyed answer
+    assert cache.get([1.0, 0.0], ("sql",)) is None
+
+
+def test_semantic_hits_and_stale_evidence():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put([1.0, 0.0], ("a",), "answer")
+    assert cache.get([0.99, 0.05], ("a",)) == "answer"
+    assert cache.get([0.0, 1.0], ("a",)) is None
+    assert cache.get([1.0, 0.0], ("b",)) is None  # the matches changed: dropped
+    assert cache.get([1.0, 0.0], ("a",)) is None
+
+
+def test_lru_eviction_spans_keyed_and_semantic_entries():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.put(None, ("sql",), "old", key="k1")
+    cache.put([1.0, 0.0], ("a",), "vector answer")
+    cache._keyed["k1"]["last_used"] -= 60  # least recently used
+    cache.put(None, ("sql",), "new", key="k2")
+    assert cache.get(None, ("sql",), key="k1") is None
+    assert cache.get([1.0, 0.0], ("a",)) == "vector answer"
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import sync_baserow_to_qdrant as sync
+
+ROWS = [{"id": i, "Event": f"Event {i}", "Venue": "Venue"} for i in range(7)]
+
+
+@pytest.fixture
+def baserow():
+    """Local stand-in for the Baserow rows API, paginating ROWS with `next` links."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            requests_seen.append(url.path)
+            if not url.path.startswith("/api/database/rows/table/"):
+                self.send_error(404)
+                return
+            page, size = int(query.get("page", ["1"])[0]), int(query["size"][0])
+            start = (page - 1) * size
+            next_url = f"http://127.0.0.1:{self.server.server_port}{url.path}?user_field_names=true&size={size}&page={page + 1}"
+            body = {
+                "count": len(ROWS),
+                "next": next_url if start + size < len(ROWS) else None,
+                "results": ROWS[start:start + size],
+            }
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests_seen
+    server.shutdown()
+
+
+def test_pages_follow_next_links(baserow):
+    base_url, requests_seen = baserow
+    pages = list(sync.iter_baserow_pages(table_id="42", base_url=base_url, page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [row["id"] for page in pages for row in page] == list(range(7))
+    assert requests_seen == ["/api/database/rows/table/42/"] * 3
+    assert sync.get_baserow_rows(table_id="42", base_url=base_url, page_size=200) == ROWS
+
+
+def test_stream_yields_every_row_in_order(baserow):
+    base_url, _ = baserow
+
+    async def collect():
+        return [row async for row in sync.stream_baserow_rows(table_id="42", base_url=base_url, page_size=2)]
+
+    assert asyncio.run(collect()) == ROWS
+
+
+def test_http_errors_are_raised(baserow):
+    base_url, _ = baserow
+    with pytest.raises(requests.HTTPError):
+        list(sync.iter_baserow_pages(table_id="42", base_url=base_url + "/missing", page_size=3))
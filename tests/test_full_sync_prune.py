@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+import sync_baserow_to_qdrant as sync
+from collection_config import VECTOR_DIM, create_collection
+from vector_store import event_point_id
+
+ROW = {"id": 1, "Event": "Open Air", "Venue": "Mauerpark", "Collection": "JuneEvents", "URL": None}
+LEGACY_ID = "0b7d9a8e-3f51-4c1e-9d2a-6e4f8b1c7a30"  # uuid4 written by the old sync
+AGENT_ID = "3c2e1f0a-9b8d-4e7c-a6f5-1d2c3b4a5e6f"
+
+
+def vector(x):
+    return [x] + [0.0] * (VECTOR_DIM - 1)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    client = QdrantClient(":memory:")
+    create_collection(client, sync.COLLECTION_NAME)
+    dossier = sync.row_to_dossier(ROW)
+    client.upsert(collection_name=sync.COLLECTION_NAME, points=[
+        PointStruct(id=LEGACY_ID, vector=vector(1.0), payload=dossier),
+        PointStruct(id=AGENT_ID, vector=vector(0.5), payload={"eventName": "Open Air", "venueName": "Mauerpark"}),
+    ])
+    monkeypatch.setattr(sync, "client", client)
+    monkeypatch.setattr(sync, "sparse_vector_for", lambda payload: None)
+    monkeypatch.setattr(sync.vector_store, "client", client)
+
+    async def embeddings(texts):
+        return [vector(0.9) for _ in texts]
+
+    async def rows():
+        yield ROW
+
+    monkeypatch.setattr(sync, "get_embeddings", embeddings)
+    monkeypatch.setattr(sync, "stream_baserow_rows", rows)
+    return client
+
+
+def ids(client):
+    points, _ = client.scroll(collection_name=sync.COLLECTION_NAME, limit=10)
+    return {str(p.id) for p in points}
+
+
+def test_full_sync_deletes_legacy_duplicates(collection):
+    asyncio.run(sync.sync(full=True))
+    assert ids(collection) == {event_point_id(sync.row_to_dossier(ROW)), AGENT_ID}
+
+
+def test_incremental_sync_deletes_nothing(collection):
+    asyncio.run(sync.sync())
+    assert ids(collection) == {event_point_id(sync.row_to_dossier(ROW)), LEGACY_ID, AGENT_ID}
@@ -0,0 +1,54 @@
+import asyncio
+
+from graph import VerificationCache, build_verifier_graph, verification_key
+
+EVENT = {"eventName": "Techno Marathon Nacht", "venueName": "Berghain"}
+
+
+class StubSearch:
+    def __init__(self, results=None, error=None):
+        self.results = results or []
+        self.error = error
+        self.calls = []
+
+    async def search(self, query, search_depth="basic"):
+        self.calls.append((query, search_depth))
+        if self.error:
+            raise self.error
+        return {"results": self.results}
+
+
+def run(graph, event=EVENT):
+    state = {"event_data": event, "verifications": [], "is_verified": False, "iterations": 0,
+             "cache_hit": False, "search_failed": False}
+    return asyncio.run(graph.ainvoke(state))
+
+
+def test_verified_event_is_cached(tmp_path):
+    cache = VerificationCache(str(tmp_path / "v.db"))
+    search = StubSearch([{"url": "https://example.org/nacht", "title": "Techno Marathon Nacht at Berghain"}])
+    result = run(build_verifier_graph(search, cache))
+    assert result["is_verified"] and result["verifications"] == ["https://example.org/nacht"]
+    assert len(search.calls) == 3  # one round, all phrasings
+    assert cache.get(verification_key(EVENT)) == (True, ["https://example.org/nacht"])
+
+    again = StubSearch()
+    assert run(build_verifier_graph(again, cache))["cache_hit"] and not again.calls
+
+
+def test_results_not_naming_the_event_get_a_refined_round(tmp_path):
+    cache = VerificationCache(str(tmp_path / "v.db"))
+    search = StubSearch([{"url": "https://example.org/other", "title": "Something else entirely"}])
+    result = run(build_verifier_graph(search, cache))
+    assert not result["is_verified"] and result["iterations"] == 2
+    assert {depth for _, depth in search.calls} == {"basic", "advanced"}
+    assert cache.get(verification_key(EVENT)) == (False, [])
+
+
+def test_search_outage_is_not_a_rejection(tmp_path):
+    cache = VerificationCache(str(tmp_path / "v.db"))
+    search = StubSearch(error=RuntimeError("tavily down"))
+    result = run(build_verifier_graph(search, cache))
+    assert result["search_failed"] and not result["is_verified"]
+    assert result["iterations"] == 1  # no refine loop on an outage
+    assert cache.get(verification_key(EVENT)) is None
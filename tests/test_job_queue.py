@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_SECONDS", 10.0)
+    monkeypatch.setattr(job_queue, "JOB_POLL_SECONDS", 0.05)
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_claim_complete(queue):
+    job_id = queue.enqueue({"event": {"eventName": "A"}})
+    assert queue.counts()["queued"] == 1
+    job = queue.claim()
+    assert job["id"] == job_id and job["payload"] == {"event": {"eventName": "A"}} and job["attempts"] == 1
+    assert queue.claim() is None  # leased
+    assert queue.complete(job, {"status": "processed"})
+    assert queue.get(job_id)["status"] == "done" and queue.get(job_id)["result"] == {"status": "processed"}
+    assert queue.get("unknown") is None
+
+
+def test_failures_back_off_then_dead_letter(queue):
+    job_id = queue.enqueue({}, max_attempts=2)
+    job = queue.claim()
+    before = time.time()
+    assert queue.fail(job, "RuntimeError: boom") == "queued"
+    status = queue.get(job_id)
+    assert status["status"] == "queued" and status["error"] == "RuntimeError: boom"
+    assert before + 8 <= status["next_attempt_at"] <= time.time() + 12  # 10s +-20% jitter
+    assert queue.claim() is None  # not due yet
+
+    queue._conn.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    job = queue.claim()
+    assert job["attempts"] == 2
+    assert queue.fail(job, "RuntimeError: again") == "dead"
+    assert queue.get(job_id)["status"] == "dead" and queue.claim() is None
+
+    assert queue.retry(job_id) and not queue.retry(job_id)
+    assert queue.claim()["attempts"] == 1
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_BACKOFF_SECONDS", 60.0)
+    monkeypatch.setattr(job_queue, "JOB_BACKOFF_SECONDS", 10.0)
+    assert job_queue.backoff_seconds(10) <= 72
+
+
+def test_expired_lease_is_reclaimed(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.01)
+    job_id = queue.enqueue({}, max_attempts=2)
+    assert queue.claim()["attempts"] == 1
+    time.sleep(0.02)
+    assert queue.claim()["attempts"] == 2  # the first worker died
+    time.sleep(0.02)
+    assert queue.claim() is None  # so did the second, on the last attempt
+    assert queue.get(job_id)["status"] == "dead"
+
+
+def test_stale_claims_cannot_write_outcomes(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.01)
+    job_id = queue.enqueue({})
+    stale = queue.claim()
+    time.sleep(0.02)
+    current = queue.claim()
+    assert current["lease_token"] != stale["lease_token"]
+    assert not queue.renew(stale)
+    assert not queue.complete(stale, {"from": "stale"}) and queue.fail(stale, "RuntimeError: late") is None
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.complete(current, {"from": "current"})
+    assert queue.get(job_id)["result"] == {"from": "current"}
+
+
+def test_heartbeat_keeps_long_jobs_leased(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(job_queue, "JOB_HEARTBEAT_SECONDS", 0.05)
+    job_id = queue.enqueue({})
+    runs = []
+
+    async def handler(payload):
+        runs.append(1)
+        await asyncio.sleep(0.6)  # three leases long
+        return {"ok": True}
+
+    async def main():
+        workers = asyncio.create_task(queue.run_workers(handler, 2))
+        for _ in range(200):
+            if queue.get(job_id)["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        workers.cancel()
+
+    asyncio.run(main())
+    assert queue.get(job_id)["status"] == "done" and queue.get(job_id)["attempts"] == 1 and runs == [1]
+
+
+def test_queue_files_without_lease_tokens_are_upgraded(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE jobs (
+            id TEXT PRIMARY KEY, status TEXT, payload TEXT, attempts INTEGER, max_attempts INTEGER,
+            run_after REAL, lease_until REAL, result TEXT, error TEXT, created_at REAL, updated_at REAL
+        )
+    """)
+    conn.commit()
+    conn.close()
+    queue = JobQueue(path)
+    queue.enqueue({})
+    job = queue.claim()
+    assert queue.complete(job, {}) and queue.counts()["done"] == 1
+
+
+def test_workers_wake_on_enqueue_from_a_thread(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_POLL_SECONDS", 30.0)  # only the wakeup can make this fast
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload["n"])
+        return {}
+
+    async def main():
+        workers = asyncio.create_task(queue.run_workers(handler, 2))
+        try:
+            await asyncio.sleep(0.05)  # workers idle
+            ids = [await asyncio.to_thread(queue.enqueue, {"n": n}) for n in range(3)]
+            for _ in range(100):
+                if all(queue.get(i)["status"] == "done" for i in ids):
+                    break
+                await asyncio.sleep(0.01)
+            return ids
+        finally:
+            workers.cancel()
+
+    ids = asyncio.run(main(), debug=True)  # debug mode rejects loop calls from other threads
+    assert sorted(handled) == [0, 1, 2] and all(queue.get(i)["status"] == "done" for i in ids)
+
+
+def test_worker_survives_queue_errors(queue):
+    real_claim = queue.claim
+    calls = []
+
+    def flaky_claim():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return real_claim()
+
+    queue.claim = flaky_claim
+    job_id = queue.enqueue({})
+
+    async def handler(payload):
+        return {"ok": True}
+
+    async def main():
+        worker = asyncio.create_task(queue.worker(handler))
+        for _ in range(100):
+            if queue.get(job_id)["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(main())
+    assert queue.get(job_id)["status"] == "done" and len(calls) >= 2
@@ -0,0 +1,57 @@
+from viewport_index import VIEWPORT_STUB_ZOOM, ViewportIndex, stub_from_payload
+
+BERLIN = (52.3, 13.0, 52.7, 13.8)  # south, west, north, east
+
+
+def stub(point_id, lat, lng, district="Mitte", **payload):
+    return stub_from_payload(point_id, {"lat": lat, "lng": lng, "eventName": point_id, "district": district, **payload})
+
+
+def build(*stubs):
+    return ViewportIndex.build({s.id: s for s in stubs})
+
+
+def test_unplaced_events_are_skipped():
+    assert stub_from_payload("a", {"eventName": "No coordinates"}) is None
+    assert stub_from_payload("b", {"lat": 0.0, "lng": 0.0}) is None
+    assert stub_from_payload("c", {"lat": "52.5", "lng": "13.4"}).lat == 52.5
+
+
+def test_clusters_count_every_event_once():
+    index = build(stub("a", 52.52, 13.40), stub("b", 52.521, 13.401), stub("c", 52.48, 13.44, "Neukölln"))
+    for zoom in range(8, VIEWPORT_STUB_ZOOM):
+        result = index.query(*BERLIN, zoom)
+        assert result["total"] == 3 and not result["events"]
+        assert sum(c["count"] for c in result["clusters"]) == 3
+    # Close together at low zoom, apart once zoomed in
+    assert len(index.query(*BERLIN, 8)["clusters"]) == 1
+    assert len(index.query(*BERLIN, 12)["clusters"]) == 2
+
+
+def test_stubs_at_high_zoom_only_inside_the_box():
+    index = build(stub("a", 52.52, 13.40), stub("b", 52.53, 13.41))
+    result = index.query(52.515, 13.395, 52.525, 13.405, VIEWPORT_STUB_ZOOM)
+    assert [s.id for s in result["events"]] == ["a"] and result["total"] == 1 and not result["clusters"]
+
+
+def test_facet_and_predicate_filters():
+    index = build(stub("a", 52.52, 13.40), stub("b", 52.48, 13.44, "Neukölln", vibeProfile=["techno"]))
+    assert index.query(*BERLIN, 10, facet=("district", "Neukölln"))["total"] == 1
+    assert index.query(*BERLIN, 10, matches=lambda s: "techno" in s.vibeProfile)["total"] == 1
+    assert index.query(*BERLIN, 16, facet=("district", "Mitte"))["events"][0].id == "a"
+
+
+def test_diff_and_apply_keep_counts_in_step():
+    index = build(stub("a", 52.52, 13.40), stub("b", 52.48, 13.44, "Neukölln"))
+    moved = stub("a", 52.55, 13.35)
+    fresh = {"a": moved, "c": stub("c", 52.50, 13.30, "Neukölln")}
+    changed, gone = index.diff(fresh)
+    assert {s.id for s in changed} == {"a", "c"} and gone == ["b"]
+    index.apply(changed, gone)
+
+    rebuilt = ViewportIndex.build(fresh)
+    assert index.stubs == rebuilt.stubs
+    assert index.levels == rebuilt.levels  # emptied cells and facets' counts are removed, not left at zero
+    assert index.members == rebuilt.members
+    assert index.query(*BERLIN, 12, facet=("district", "Neukölln"))["total"] == 1
+    assert index.diff(fresh) == ([], [])